@@ -0,0 +1,73 @@
+"""Measures how long a fresh interpreter takes to import the package, for short-lived scripts.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --runs 20 --output results.json
+
+Each case runs in a new process, the interpreter start up without imports is reported as `bare`.
+"""
+import argparse
+import json
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+CASES = {
+    'bare': 'pass',
+    'package': 'import pachca_client',
+    'send': 'from pachca_client import send',
+    'client': 'from pachca_client import Client; Client("")',
+    'pachca': 'from pachca_client import get_pachca; get_pachca("")',
+}
+
+
+def wall_times(code: str, runs: int) -> List[float]:
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True)
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def import_time(code: str) -> float:
+    # cumulative microseconds of the top-level imports reported by -X importtime, site is excluded
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            check=True, capture_output=True, text=True).stderr
+    total = 0
+    for line in output.splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \| (\S+)$', line)
+        if match and match.group(2) != 'site':
+            total += int(match.group(1))
+    return total / 1e3
+
+
+def run(runs: int) -> Dict:
+    results = {}
+    for name, code in CASES.items():
+        times = wall_times(code, runs)
+        results[f'{name}_median_ms'] = statistics.median(times) * 1e3
+        results[f'{name}_min_ms'] = min(times) * 1e3
+        results[f'{name}_imports_ms'] = import_time(code)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='processes started for each case')
+    parser.add_argument('--output', help='write the results as json to the file')
+    args = parser.parse_args()
+
+    results = run(args.runs)
+    for name, value in results.items():
+        print(f'{name:>40} {value:>12.2f}')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': platform.python_version(), 'runs': args.runs, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
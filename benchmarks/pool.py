@@ -0,0 +1,46 @@
+"""Measures request latency of a Client shared by N threads with and without connection pooling.
+
+    python -m benchmarks.pool
+"""
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pachca_client import Client
+from benchmarks.server import BenchmarkServer
+
+THREADS = (1, 4, 16, 32)
+REQUESTS = 400
+
+
+def run(url: str, threads: int, **kwargs):
+    client = Client('', **kwargs)
+    client.API_URL = url
+
+    def request(_):
+        started = time.perf_counter()
+        client.call_api('chats')
+        return time.perf_counter() - started
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = sorted(executor.map(request, range(REQUESTS)))
+    client.close()
+    return statistics.mean(latencies), latencies[int(len(latencies) * 0.95)]
+
+
+def main():
+    configs = {
+        'no keep-alive': lambda threads: {'keep_alive': False},
+        'default pool': lambda threads: {},
+        'pool per thread': lambda threads: {'pool_maxsize': threads},
+    }
+    print(f'{"threads":>8} {"config":>16} {"mean, ms":>9} {"p95, ms":>9} {"connections":>12}')
+    for threads in THREADS:
+        for name, config in configs.items():
+            with BenchmarkServer(latency=0.001) as server:
+                mean, p95 = run(server.url, threads, **config(threads))
+                connections = server.connections
+            print(f'{threads:>8} {name:>16} {mean * 1000:>9.2f} {p95 * 1000:>9.2f} {connections:>12}')
+
+
+if __name__ == '__main__':
+    main()
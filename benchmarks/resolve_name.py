@@ -0,0 +1,36 @@
+"""Compares linear name lookup with the indexed one for growing directories.
+
+    python -m benchmarks.resolve_name
+"""
+import timeit
+from unittest import mock
+
+from pachca_client import Cache, Client, Pachca
+
+SIZES = (100, 1000, 10000, 50000)
+LOOKUPS = 1000
+
+
+def linear_scan(chats, name):
+    for chat in chats:
+        if chat['name'] == name:
+            return chat['id']
+    return None
+
+
+def main():
+    print(f'{"chats":>8} {"linear, us":>12} {"indexed, us":>12}')
+    for size in SIZES:
+        chats = [{'id': i, 'name': f'chat-{i}'} for i in range(size)]
+        pachca = Pachca(Client(''), Cache())
+        pachca.list_all_chats = mock.MagicMock(return_value=chats)
+        pachca.set_cached('chats', chats)
+        # the worst case for the linear scan is the last entry
+        name = chats[-1]['name']
+        linear = timeit.timeit(lambda: linear_scan(chats, name), number=LOOKUPS)
+        indexed = timeit.timeit(lambda: pachca.resolve_chat_name(name), number=LOOKUPS)
+        print(f'{size:>8} {linear / LOOKUPS * 1e6:>12.2f} {indexed / LOOKUPS * 1e6:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
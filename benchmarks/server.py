@@ -0,0 +1,146 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+API_PATH = '/api/shared/v1/'
+DIRECT_UPLOAD_PATH = '/direct_upload'
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class BenchmarkServer:
+    # local HTTP server answering every request with an empty list after `latency` seconds
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.connections = 0
+        # bytes received by the direct upload path
+        self.uploaded = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05, ), daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        return f'http://{host}:{port}/'
+
+    def __enter__(self) -> 'BenchmarkServer':
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def respond(self, method: str, path: str, query: Dict[str, str], body: bytes) -> Tuple[int, Dict]:
+        return 200, {'data': []}
+
+    def make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with server.lock:
+                    server.connections += 1
+
+            def handle_request(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                url = urlsplit(self.path)
+                query = {name: values[0] for name, values in parse_qs(url.query).items()}
+                length = int(self.headers.get('Content-Length') or 0)
+                if url.path == DIRECT_UPLOAD_PATH:
+                    # uploads are drained by chunks, they may be larger than memory is worth
+                    body = b''
+                    received = 0
+                    while received < length:
+                        received += len(self.rfile.read(min(length - received, READ_CHUNK_SIZE)))
+                    with server.lock:
+                        server.uploaded += received
+                else:
+                    body = self.rfile.read(length)
+                status, data = server.respond(self.command, url.path, query, body)
+                payload = json.dumps(data).encode() if data is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                if self.close_connection:
+                    self.send_header('Connection', 'close')
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PUT = do_DELETE = handle_request
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class MockPachcaServer(BenchmarkServer):
+    # stand-in for the Pachca API with generated chats, users and messages;
+    # lists are paged by at most `max_per` entries and uploads go to the server itself
+
+    def __init__(self,
+                 latency: float = 0.0,
+                 chats: int = 500,
+                 users: int = 500,
+                 messages: int = 500,
+                 max_per: int = 50) -> None:
+        super().__init__(latency)
+        self.max_per = max_per
+        self.chats = [{'id': i, 'name': f'chat-{i}'} for i in range(1, chats + 1)]
+        self.users = [{'id': i, 'nickname': f'user-{i}'} for i in range(1, users + 1)]
+        self.messages = [{'id': i, 'content': f'message {i}'} for i in range(1, messages + 1)]
+        self.next_id = messages + 1
+
+    @property
+    def api_url(self) -> str:
+        return self.url.rstrip('/') + API_PATH
+
+    def page(self, entries: List[Dict], query: Dict[str, str]) -> List[Dict]:
+        per = min(int(query.get('per', 50)), self.max_per)
+        page = int(query.get('page', 1))
+        return entries[(page - 1) * per:page * per]
+
+    def respond(self, method: str, path: str, query: Dict[str, str], body: bytes) -> Tuple[int, Dict]:
+        if path == DIRECT_UPLOAD_PATH:
+            return 201, None
+        path = path[len(API_PATH):] if path.startswith(API_PATH) else path.lstrip('/')
+        if method == 'GET' and path == 'chats':
+            return 200, {'data': self.page(self.chats, query)}
+        if method == 'GET' and path == 'users':
+            return 200, {'data': self.page(self.users, query)}
+        if method == 'GET' and path == 'messages':
+            return 200, {'data': self.page(self.messages, query)}
+        if method == 'POST' and path == 'messages':
+            message = json.loads(body)['message']
+            with self.lock:
+                message['id'] = self.next_id
+                self.next_id += 1
+            return 201, {'data': message}
+        if method == 'POST' and path == 'uploads':
+            return 201, {
+                'Content-Disposition': 'attachment',
+                'acl': 'private',
+                'policy': 'policy',
+                'x-amz-credential': 'credential',
+                'x-amz-algorithm': 'AWS4-HMAC-SHA256',
+                'x-amz-date': '20240101T000000Z',
+                'x-amz-signature': 'signature',
+                'key': 'attaches/files/1/${filename}',
+                'direct_url': self.url.rstrip('/') + DIRECT_UPLOAD_PATH
+            }
+        match = re.fullmatch(r'(chats|messages|users)/(\d+)', path)
+        if method == 'GET' and match:
+            return 200, {'data': {'id': int(match.group(2))}}
+        return 404, {'errors': [{'key': 'path', 'value': path}]}
@@ -0,0 +1,142 @@
+"""Runs the client against a local mock of the Pachca API and reports throughput and timings.
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --latency 0.02 --output results.json
+    python -m benchmarks.suite --compare baseline.json
+
+With --compare the run fails if any result is more than --tolerance worse than the baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from pachca_client import Cache, Client, File, Pachca
+from benchmarks.server import MockPachcaServer
+
+# results where a greater value is better, the rest are timings
+HIGHER_IS_BETTER = ('messages_per_second', 'upload_mib_per_second')
+
+
+def make_pachca(server: MockPachcaServer, workers: int = 1, **kwargs) -> Pachca:
+    client = Client('', pool_maxsize=max(workers, 1))
+    client.API_URL = server.api_url
+    return Pachca(client, Cache(), **kwargs)
+
+
+def timed(func: Callable[[], object]) -> float:
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def bench_new_message(server: MockPachcaServer, count: int, workers: int) -> Dict:
+    # sequential sends show the per-request overhead, concurrent ones the pool throughput
+    pachca = make_pachca(server, workers)
+
+    def send(i):
+        pachca.new_message(chat_id=1, content=f'message {i}')
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        elapsed = timed(lambda: list(executor.map(send, range(count))))
+    pachca.client.close()
+    return {f'messages_per_second_workers_{workers}': count / elapsed}
+
+
+def bench_resolve(server: MockPachcaServer, lookups: int) -> Dict:
+    pachca = make_pachca(server)
+    name = server.chats[-1]['name']
+    # the first lookup loads all chats, the rest are served from the cache
+    cold = timed(lambda: pachca.resolve_chat_name(name))
+    warm = timed(lambda: [pachca.resolve_chat_name(name) for _ in range(lookups)])
+    pachca.client.close()
+    return {'resolve_cold_seconds': cold, 'resolve_warm_us': warm / lookups * 1e6}
+
+
+def bench_crawl(server: MockPachcaServer, window: int) -> Dict:
+    pachca = make_pachca(server, window, page_window=window)
+    chats = timed(lambda: pachca.list_all_chats(per=server.max_per))
+    users = timed(lambda: pachca.list_all_users(per=server.max_per))
+    pachca.client.close()
+    return {f'list_all_chats_window_{window}_seconds': chats, f'list_all_users_window_{window}_seconds': users}
+
+
+def bench_upload(server: MockPachcaServer, size_mib: int) -> Dict:
+    pachca = make_pachca(server)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'payload.bin')
+        with open(path, 'wb') as f:
+            for _ in range(size_mib):
+                f.write(os.urandom(1024 * 1024))
+        elapsed = timed(lambda: pachca.upload(File(path)))
+    pachca.client.close()
+    return {'upload_mib_per_second': size_mib / elapsed}
+
+
+def run(args: argparse.Namespace) -> Dict:
+    results = {}
+    with MockPachcaServer(latency=args.latency, chats=args.entries, users=args.entries, max_per=args.per) as server:
+        results.update(bench_new_message(server, args.messages, 1))
+        results.update(bench_new_message(server, args.messages, args.workers))
+        results.update(bench_resolve(server, args.lookups))
+        results.update(bench_crawl(server, 1))
+        results.update(bench_crawl(server, args.window))
+        results.update(bench_upload(server, args.upload_mib))
+    return results
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    for name, value in results.items():
+        if name not in baseline or not baseline[name]:
+            continue
+        if name.startswith(HIGHER_IS_BETTER):
+            change = baseline[name] / value - 1 if value else float('inf')
+        else:
+            change = value / baseline[name] - 1
+        if change > tolerance:
+            regressions.append(f'{name}: {baseline[name]:.4g} -> {value:.4g} ({change:+.0%})')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.001, help='server latency per request, seconds')
+    parser.add_argument('--per', type=int, default=50, help='page size')
+    parser.add_argument('--entries', type=int, default=2000, help='number of chats and users')
+    parser.add_argument('--messages', type=int, default=200, help='messages sent by each new_message run')
+    parser.add_argument('--workers', type=int, default=8, help='threads sending messages concurrently')
+    parser.add_argument('--window', type=int, default=4, help='pages requested concurrently by list_all_*')
+    parser.add_argument('--lookups', type=int, default=10000, help='cached name lookups')
+    parser.add_argument('--upload-mib', type=int, default=32, help='size of the uploaded file, MiB')
+    parser.add_argument('--output', help='write the results as json to the file')
+    parser.add_argument('--compare', help='json file of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression')
+    args = parser.parse_args()
+
+    results = run(args)
+    report = {
+        'python': platform.python_version(),
+        'config': {name: value for name, value in vars(args).items() if name not in ('output', 'compare')},
+        'results': results
+    }
+    for name, value in results.items():
+        print(f'{name:>40} {value:>12.4f}')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f)['results'], args.tolerance)
+        for regression in regressions:
+            print(f'regression {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,50 @@
-from pachca_client.api.pachca import Pachca
-from pachca_client.api.client import Client
-from pachca_client.api.cache import Cache
-from pachca_client.api.file import File         # noqa: F401
-from pachca_client.api.button import Button     # noqa: F401
+import importlib
+from typing import TYPE_CHECKING
 
+if TYPE_CHECKING:
+    from pachca_client.api.pachca import Pachca
+
+# Public names and the modules defining them. The modules are imported on first access,
+# so `import pachca_client` does not load requests or the parts of the client which are not used.
+# For the same reason requests is imported by Client and asyncio by the coroutines which use it.
+EXPORTS = {
+    'Pachca': 'pachca_client.api.pachca',
+    'Client': 'pachca_client.api.client',
+    'Cache': 'pachca_client.api.cache',
+    'SqliteCache': 'pachca_client.api.cache',
+    'Stats': 'pachca_client.api.stats',
+    'Outbox': 'pachca_client.api.outbox',
+    'Checkpoints': 'pachca_client.api.history',
+    'HistorySync': 'pachca_client.api.history',
+    'File': 'pachca_client.api.file',
+    'Chat': 'pachca_client.api.models',
+    'Message': 'pachca_client.api.models',
+    'Reaction': 'pachca_client.api.models',
+    'User': 'pachca_client.api.models',
+    'Button': 'pachca_client.api.button',
+    'send': 'pachca_client.api.notify',
+}
+
+__all__ = sorted(EXPORTS) + ['get_pachca']
+
+
+def __getattr__(name: str):
+    if name not in EXPORTS:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(EXPORTS))
+
+
+def get_pachca(access_token: str, cache_enabled: bool = True, proxies: dict = {}) -> 'Pachca':
+    from pachca_client.api.cache import Cache
+    from pachca_client.api.client import Client
+    from pachca_client.api.pachca import Pachca
 
-def get_pachca(access_token: str, cache_enabled: bool = True, proxies: dict = {}) -> Pachca:
     client = Client(access_token, proxies=proxies)
     cache = None
     if cache_enabled:
@@ -0,0 +1,168 @@
+import asyncio
+import time
+from typing import AsyncIterator, Dict, Optional, IO
+from urllib.parse import urlparse
+
+import aiohttp
+
+from pachca_client.api.client import (BaseClient,
+                                      BufferedResponse,
+                                      ApiResponse,
+                                      body_size,
+                                      ApiJsonPayload,
+                                      DEFAULT_POOL_CONNECTIONS,
+                                      DEFAULT_POOL_MAXSIZE,
+                                      DEFAULT_TIMEOUT)
+from pachca_client.api.codec import JsonCodec
+from pachca_client.api.coalesce import AsyncSingleFlight, request_key
+from pachca_client.api.conditional import conditional_headers
+from pachca_client.api.multipart import MultipartEncoder
+from pachca_client.api.ratelimit import TokenBucket
+from pachca_client.api.retry import RetryPolicy
+
+
+# kept for code importing it from here
+AsyncResponse = BufferedResponse
+
+
+class AsyncClient(BaseClient):
+
+    def __init__(self,
+                 access_token: str,
+                 proxies: Dict = {},
+                 raise_on_error: bool = True,
+                 timeout: int = DEFAULT_TIMEOUT,
+                 retry: Optional[RetryPolicy] = None,
+                 rate_limiter: Optional[TokenBucket] = None,
+                 pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 keep_alive: bool = True,
+                 idle_timeout: Optional[float] = None,
+                 session: Optional[aiohttp.ClientSession] = None,
+                 codec: Optional[JsonCodec] = None,
+                 coalesce: bool = False,
+                 conditional: bool = False) -> None:
+        super().__init__(access_token, proxies=proxies, raise_on_error=raise_on_error, timeout=timeout,
+                         retry=retry, rate_limiter=rate_limiter, pool_connections=pool_connections,
+                         pool_maxsize=pool_maxsize, keep_alive=keep_alive, idle_timeout=idle_timeout,
+                         codec=codec, coalesce=coalesce, conditional=conditional)
+        self.flights = AsyncSingleFlight()
+        # the session is bound to an event loop, so it is created on the first call
+        self.session = session
+
+    async def __aenter__(self) -> 'AsyncClient':
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def call_api(self, path: str, method: str = 'get', payload: ApiJsonPayload = None, retryable: Optional[bool] = None) -> ApiResponse:
+        kwargs = {}
+        if payload:
+            if method == 'get':
+                kwargs['params'] = payload
+            else:
+                # encoded here rather than by aiohttp, so the codec is used and the request size is known to the hooks
+                kwargs['data'] = self.codec.dumps(payload)
+                kwargs['headers'] = {'Content-Type': 'application/json'}
+        if self.coalesce and method == 'get':
+            return await self.flights.do(request_key(path, payload),
+                                         lambda: self.call(method, self.request_url(path), retryable=retryable, **kwargs))
+        return await self.call(method, self.request_url(path), retryable=retryable, **kwargs)
+
+    async def call(self, method: str, url: str, retryable: Optional[bool] = None, **kwargs) -> ApiResponse:
+        conditional = self.validators is not None and method.upper() == 'GET'
+        if conditional:
+            key = request_key(url, kwargs.get('params'))
+            entry = self.validators.get(key)
+            kwargs['headers'] = dict(kwargs.get('headers') or {}, **conditional_headers(entry))
+        attempt = 1
+        while True:
+            if self.rate_limiter is not None:
+                # the token is reserved at once, so the event loop is not blocked while waiting
+                await asyncio.sleep(self.rate_limiter.reserve())
+            self.run_hooks('request', method=method.upper(), url=url, attempt=attempt, size=request_size(kwargs))
+            started = time.monotonic()
+            try:
+                response = await self.send(method, url, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                self.run_hooks('response', method=method.upper(), url=url, attempt=attempt,
+                               status_code=None, elapsed=time.monotonic() - started, size=0, error=e)
+                delay = self.retry_delay(method.upper(), url, attempt, retryable, error=e)
+                if delay is None:
+                    raise
+            else:
+                self.run_hooks('response', method=method.upper(), url=url, attempt=attempt,
+                               status_code=response.status_code, elapsed=time.monotonic() - started,
+                               size=len(response.content), error=None)
+                delay = self.retry_delay(method.upper(), url, attempt, retryable,
+                                         response.status_code, response.headers.get('Retry-After'))
+                if delay is None:
+                    if conditional:
+                        return self.handle_conditional(key, entry, response)
+                    return self.handle_response(response)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def send(self, method: str, url: str, headers: Optional[Dict] = None, **kwargs) -> BufferedResponse:
+        session = self.get_session()
+        async with session.request(method,
+                                   url,
+                                   headers=dict(self.headers, **(headers or {})),
+                                   proxy=self.proxies.get(urlparse(url).scheme),
+                                   timeout=aiohttp.ClientTimeout(total=self.timeout),
+                                   **kwargs) as response:
+            content = await response.read()
+            encoding = response.charset or 'utf-8'
+        return BufferedResponse(response.status, content, encoding, response.headers)
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(connector=self.make_connector())
+        return self.session
+
+    def make_connector(self) -> aiohttp.TCPConnector:
+        kwargs = {}
+        if not self.keep_alive:
+            kwargs['force_close'] = True
+        elif self.idle_timeout is not None:
+            kwargs['keepalive_timeout'] = self.idle_timeout
+        return aiohttp.TCPConnector(limit=self.pool_connections * self.pool_maxsize,
+                                    limit_per_host=self.pool_maxsize,
+                                    **kwargs)
+
+    async def upload(self, url: str, file: IO, data: Dict) -> ApiResponse:
+        form = aiohttp.FormData(data)
+        form.add_field('file', file)
+        return await self.call('post', url, data=form)
+
+    async def upload_stream(self, url: str, body: MultipartEncoder) -> ApiResponse:
+        headers = {
+            'Content-Type': body.content_type,
+            'Content-Length': str(len(body))
+        }
+        return await self.call('post', url, headers=headers, data=read_chunks(body))
+
+
+def request_size(kwargs: Dict) -> int:
+    # a streamed body is an async generator, its length is only known from the header
+    length = (kwargs.get('headers') or {}).get('Content-Length')
+    if length is not None:
+        return int(length)
+    return body_size(kwargs.get('data'))
+
+
+async def read_chunks(body: MultipartEncoder) -> AsyncIterator[bytes]:
+    # the file is read in the default executor, so the event loop is not blocked
+    loop = asyncio.get_running_loop()
+    chunks = iter(body)
+    while True:
+        chunk = await loop.run_in_executor(None, next, chunks, None)
+        if chunk is None:
+            return
+        yield chunk
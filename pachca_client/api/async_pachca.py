@@ -0,0 +1,462 @@
+import asyncio
+import functools
+import time
+from collections import Counter
+from typing import AsyncIterator, Awaitable, Callable, Hashable, Optional, Dict, List, Tuple, Union
+
+from pachca_client.api.batch import BatchResult, aidempotent, aimap_unordered, amap_ordered, amap_results
+from pachca_client.api.cache import BaseCache
+from pachca_client.api.client import BaseClient
+
+from pachca_client.api.file import File
+from pachca_client.api.models import Chat, Message, Reaction, User
+from pachca_client.api.multipart import MultipartEncoder
+from pachca_client.api.exceptions import PachcaClientNotResolved
+from pachca_client.api.paging import aiter_pages
+from pachca_client.api.pachca import (BasePachca,
+                                      build_index,
+                                      index_scope,
+                                      prefetch_window,
+                                      logger,
+                                      message_payload,
+                                      named_scopes,
+                                      shared_files,
+                                      upload_scope,
+                                      validate_paging,
+                                      CHAT_TYPE_DISCUSSION,
+                                      CHAT_TYPE_USER,
+                                      INDEX_FIELDS,
+                                      PATH_CHATS,
+                                      PATH_MESSAGES,
+                                      PATH_UPLOAD,
+                                      PATH_USERS)
+
+
+def atimed(func):
+    # the same as timed for coroutines
+    @functools.wraps(func)
+    async def inner(self, *args, **kwargs):
+        if not self.hooks['call']:
+            return await func(self, *args, **kwargs)
+        started = time.monotonic()
+        error = None
+        try:
+            return await func(self, *args, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.run_hooks('call', method=func.__name__, elapsed=time.monotonic() - started, error=error)
+
+    return inner
+
+
+class AsyncPachca(BasePachca):
+    def __init__(self,
+                 client: BaseClient,
+                 cache: Optional[BaseCache] = None,
+                 page_window: int = 1,
+                 stale_while_revalidate: bool = False,
+                 upload_workers: int = 4,
+                 upload_ttl: Optional[int] = None,
+                 models: bool = False,
+                 cache_raw: bool = False,
+                 entity_ttl: Optional[int] = None) -> None:
+        super().__init__(client, cache, page_window, stale_while_revalidate, upload_workers, upload_ttl, models, cache_raw,
+                         entity_ttl)
+        # asyncio locks are created on first use to be bound to the running loop
+        self.locks = {}
+        self.refreshing = set()
+        self.tasks = set()
+
+    async def __aenter__(self) -> 'AsyncPachca':
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.client.close()
+
+    @atimed
+    async def add_reactions(self, reactions: List[Tuple[int, str]], workers: int = 4) -> List[BatchResult]:
+        return await amap_results(aidempotent(lambda reaction: self.new_reaction(*reaction)), reactions, workers)
+
+    @atimed
+    async def collect_reactions(self,
+                                chat_id: int,
+                                workers: int = 4,
+                                per: int = 50,
+                                key: Optional[Callable[[Dict], Hashable]] = None,
+                                select: Optional[Callable[[Dict], bool]] = None) -> Counter:
+        key = key or (lambda reaction: reaction['code'])
+
+        async def count(message_id: int) -> Counter:
+            return Counter([key(reaction) async for reaction in self.iter_reactions(message_id, per=per)])
+        message_ids = (message['id'] async for message in self.iter_messages(chat_id, per=per, prefetch=True)
+                       if select is None or select(message))
+        counts = Counter()
+        async for reactions in aimap_unordered(count, message_ids, workers):
+            counts.update(reactions)
+        return counts
+
+    @atimed
+    async def delete_message(self, message_id: int) -> None:
+        response = await self.client.call_api(f'{PATH_MESSAGES}/{message_id}', method='delete')
+        self.forget_entity(PATH_MESSAGES, message_id)
+        return response
+
+    @atimed
+    async def delete_reaction(self, message_id: int, code: str) -> None:
+        payload = {
+            'code': code
+        }
+        await self.client.call_api(f'{PATH_MESSAGES}/{message_id}/reactions', method='delete', payload=payload)
+
+    @atimed
+    async def get_message(self, message_id) -> Optional[Dict]:
+        message = self.get_entity(PATH_MESSAGES, message_id)
+        if message is None:
+            message = await self.client.call_api(f'{PATH_MESSAGES}/{message_id}')
+            self.set_entity(PATH_MESSAGES, message_id, message)
+        return self.decoded(Message, message)
+
+    @atimed
+    async def get_chat(self, chat_id: Union[str, int]) -> Optional[Dict]:
+        if isinstance(chat_id, str):
+            chat_id = await self.resolve_chat_name(chat_id)
+            if chat_id is None:
+                raise PachcaClientNotResolved(chat_id)
+        chat = self.get_entity(PATH_CHATS, chat_id)
+        if chat is None:
+            chat = await self.client.call_api(f'{PATH_CHATS}/{chat_id}')
+            self.set_entity(PATH_CHATS, chat_id, chat)
+        return self.decoded(Chat, chat)
+
+    async def get_index(self, scope: str, fetch: Callable[[], Awaitable[List]]) -> Dict:
+        if self.cache is None:
+            return build_index(await fetch(), INDEX_FIELDS[scope])
+        index, expired = self.lookup_cached(index_scope(scope))
+        if index is not None and not expired:
+            return index
+        if index is not None and self.stale_while_revalidate:
+            self.revalidate(scope, fetch)
+            return index
+        async with self.get_lock(scope):
+            index = self.get_cached(index_scope(scope))
+            if index is not None:
+                return index
+            return self.loaded_index(scope, await fetch())
+
+    def get_lock(self, scope: str) -> asyncio.Lock:
+        if scope not in self.locks:
+            self.locks[scope] = asyncio.Lock()
+        return self.locks[scope]
+
+    @validate_paging
+    async def iter_chats(self,
+                         per: int = 50,
+                         availability: str = 'is_member',
+                         last_message_at_after: Optional[str] = None,
+                         last_message_at_before: Optional[str] = None,
+                         prefetch: bool = False) -> AsyncIterator[Dict]:
+        def fetch(page: int) -> Awaitable[List]:
+            return self.list_chats(per, page, availability, last_message_at_after, last_message_at_before)
+        async for response in aiter_pages(fetch, per, prefetch_window(prefetch)):
+            for chat in response:
+                yield chat
+
+    @validate_paging
+    async def iter_messages(self, chat_id: int, per: int = 50, prefetch: bool = False) -> AsyncIterator[Dict]:
+        async def fetch(page: int) -> List:
+            return await self.list_messages(chat_id, per=per, page=page) or []
+        async for response in aiter_pages(fetch, per, prefetch_window(prefetch)):
+            for message in response:
+                yield message
+
+    @validate_paging
+    async def iter_reactions(self, message_id: int, per: int = 50, prefetch: bool = False) -> AsyncIterator[Dict]:
+        async def fetch(page: int) -> List:
+            return await self.list_reactions(message_id, per=per, page=page) or []
+        async for response in aiter_pages(fetch, per, prefetch_window(prefetch)):
+            for reaction in response:
+                yield reaction
+
+    @validate_paging
+    async def iter_users(self, per: int = 50, query: Optional[str] = None, prefetch: bool = False) -> AsyncIterator[Dict]:
+        def fetch(page: int) -> Awaitable[List]:
+            return self.list_users(per=per, page=page, query=query)
+        async for response in aiter_pages(fetch, per, prefetch_window(prefetch)):
+            for user in response:
+                yield user
+
+    @atimed
+    @validate_paging
+    async def list_all_chats(self, per: int = 50, window: Optional[int] = None) -> List:
+        chats = []
+        pages = aiter_pages(lambda page: self.list_chats(per, page), per, window or self.page_window)
+        async for response in pages:
+            chats.extend(response)
+        return self.set_cached(PATH_CHATS, chats)
+
+    @atimed
+    @validate_paging
+    async def list_all_users(self, per: int = 50, window: Optional[int] = None) -> List:
+        users = []
+        pages = aiter_pages(lambda page: self.list_users(per=per, page=page), per, window or self.page_window)
+        async for response in pages:
+            users.extend(response)
+        return self.set_cached(PATH_USERS, users)
+
+    @atimed
+    @validate_paging
+    async def list_chats(self,
+                         per: int = 50,
+                         page: int = 1,
+                         availability: str = 'is_member',
+                         last_message_at_after: Optional[str] = None,
+                         last_message_at_before: Optional[str] = None) -> List:
+        payload = {
+            'per': per,
+            'page': page,
+            'availability': availability}
+        if last_message_at_after:
+            payload['last_message_at_after'] = last_message_at_after
+        if last_message_at_before:
+            payload['last_message_at_before'] = last_message_at_before
+        response = await self.client.call_api(path=PATH_CHATS, payload=payload)
+        if response is None:
+            return []
+        return self.decoded(Chat, response)
+
+    @atimed
+    @validate_paging
+    async def list_messages(self,
+                            chat_id: int,
+                            per: int = 50,
+                            page: int = 1) -> Optional[List]:
+        payload = {
+            'chat_id': chat_id,
+            'per': per,
+            'page': page}
+        return self.decoded(Message, await self.client.call_api(path=PATH_MESSAGES, payload=payload))
+
+    @atimed
+    @validate_paging
+    async def list_reactions(self,
+                             message_id: int,
+                             per: int = 50,
+                             page: int = 1) -> Optional[List]:
+        payload = {
+            'per': per,
+            'page': page
+        }
+        return self.decoded(Reaction, await self.client.call_api(path=f'{PATH_MESSAGES}/{message_id}/reactions', payload=payload))
+
+    @atimed
+    @validate_paging
+    async def list_users(self,
+                         per: int = 50,
+                         page: int = 1,
+                         query: Optional[str] = None) -> List:
+        payload = {
+            'per': per,
+            'page': page
+        }
+        if query:
+            payload['query'] = query
+        response = await self.client.call_api(path=PATH_USERS, payload=payload)
+        if response is None:
+            return []
+        return self.decoded(User, response)
+
+    @atimed
+    async def new_chat(self,
+                       name: str,
+                       members: List[int],
+                       group_tags: Optional[List[int]] = None,
+                       is_channel: bool = False,
+                       is_public: bool = False) -> Optional[Dict]:
+        chat = {
+            'name': name,
+            'member_ids': members,
+            'channel': is_channel,
+            'public': is_public
+        }
+        if group_tags is not None:
+            chat['group_tag_ids'] = group_tags
+        payload = {
+            'chat': chat
+        }
+        response = self.decoded(Chat, await self.client.call_api(PATH_CHATS, 'post', payload))
+        self.patch_cached(PATH_CHATS, [response])
+        return response
+
+    @atimed
+    async def new_message(self,
+                          chat_id: Union[str, int],
+                          content: str,
+                          chat_type: str = CHAT_TYPE_DISCUSSION,
+                          parent_message_id: int = None,
+                          skip_invite_mentions: bool = False,
+                          link_preview: bool = False,
+                          buttons: List[List[Dict]] = [],
+                          files: List[File] = []) -> Optional[Dict]:
+        if isinstance(chat_id, str):
+            if chat_type == CHAT_TYPE_DISCUSSION:
+                chat_id = await self.resolve_chat_name(chat_id)
+            elif chat_type == CHAT_TYPE_USER:
+                chat_id = await self.resolve_user_name(chat_id)
+            if chat_id is None:
+                raise PachcaClientNotResolved(chat_id)
+        attachments = []
+        if len(files) != 0:
+            attachments = await self.upload_files(files)
+        payload = message_payload(chat_id, content, chat_type, parent_message_id, skip_invite_mentions,
+                                  link_preview, buttons, attachments)
+        return self.decoded(Message, await self.client.call_api(path=PATH_MESSAGES, method='post', payload=payload))
+
+    @atimed
+    async def new_reaction(self, message_id: int, code: str) -> None:
+        payload = {
+            'code': code
+        }
+        await self.client.call_api(f'{PATH_MESSAGES}/{message_id}/reactions', method='post', payload=payload)
+
+    @atimed
+    async def new_thread(self, message_id: int) -> Optional[Dict]:
+        return await self.client.call_api(f'{PATH_MESSAGES}/{message_id}/thread', method='post')
+
+    @atimed
+    async def pin_message(self, message_id: int) -> None:
+        return await self.client.call_api(f'{PATH_MESSAGES}/{message_id}/pin', method='post')
+
+    @atimed
+    async def pin_messages(self, message_ids: List[int], workers: int = 4) -> List[BatchResult]:
+        return await amap_results(aidempotent(self.pin_message), message_ids, workers)
+
+    @atimed
+    async def remove_reactions(self, reactions: List[Tuple[int, str]], workers: int = 4) -> List[BatchResult]:
+        return await amap_results(aidempotent(lambda reaction: self.delete_reaction(*reaction)), reactions, workers)
+
+    @atimed
+    async def refresh_chats(self, last_message_at_after: str) -> List:
+        chats = [chat async for chat in self.iter_chats(last_message_at_after=last_message_at_after)]
+        self.patch_cached(PATH_CHATS, chats)
+        return chats
+
+    @atimed
+    async def resolve_chat_name(self, name: str) -> Optional[int]:
+        return (await self.get_index(PATH_CHATS, self.list_all_chats)).get(name)
+
+    @atimed
+    async def resolve_user_name(self, name: str) -> Optional[int]:
+        return (await self.get_index(PATH_USERS, self.list_all_users)).get(name)
+
+    def revalidate(self, scope: str, fetch: Callable[[], Awaitable[List]]) -> None:
+        if scope in self.refreshing:
+            return
+        self.refreshing.add(scope)
+
+        async def run():
+            try:
+                async with self.get_lock(scope):
+                    await fetch()
+            except Exception as e:
+                logger.error(f'failed to refresh {scope}: {e}')
+            finally:
+                self.refreshing.discard(scope)
+        task = asyncio.ensure_future(run())
+        # keep a reference until the task is done
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    @atimed
+    async def send_many(self, messages: List[Dict], workers: int = 4) -> List[BatchResult]:
+        indexes = {}
+        for scope in named_scopes(messages):
+            try:
+                indexes[scope] = await self.get_index(scope, self.list_all_chats if scope == PATH_CHATS else self.list_all_users)
+            except Exception as e:
+                indexes[scope] = e
+        uploads = {id(upload.item): upload for upload in await amap_results(self.upload_file, shared_files(messages), self.upload_workers)}
+
+        async def send(message: Dict) -> Optional[Dict]:
+            payload = self.batch_payload(message, indexes, uploads)
+            return self.decoded(Message, await self.client.call_api(path=PATH_MESSAGES, method='post', payload=payload))
+        return await amap_results(send, messages, workers)
+
+    @atimed
+    async def unpin_message(self, message_id: int) -> None:
+        return await self.client.call_api(f'{PATH_MESSAGES}/{message_id}/pin', method='delete')
+
+    @atimed
+    async def unpin_messages(self, message_ids: List[int], workers: int = 4) -> List[BatchResult]:
+        return await amap_results(aidempotent(self.unpin_message), message_ids, workers)
+
+    @atimed
+    async def update_chat(self,
+                          chat_id: Union[str, int],
+                          name: str,
+                          is_public: bool = False) -> Optional[Dict]:
+        if isinstance(chat_id, str):
+            chat_id = await self.resolve_chat_name(chat_id)
+        payload = {
+            'chat': {
+                'name': name,
+                'public': is_public
+            }
+        }
+        path = f'{PATH_CHATS}/{chat_id}'
+        response = self.decoded(Chat, await self.client.call_api(path, 'put', payload))
+        self.forget_entity(PATH_CHATS, chat_id)
+        self.patch_cached(PATH_CHATS, [response])
+        return response
+
+    @atimed
+    async def update_message(self,
+                             message_id: int,
+                             content: str,
+                             buttons: List[List[Dict]] = None,
+                             files: List[File] = []) -> Optional[Dict]:
+        message = {
+            'content': content,
+            'files': []
+        }
+        if buttons:
+            # set value [] to remove buttons
+            message['buttons'] = buttons
+        if len(files) != 0:
+            # the files replace the attachments of the message
+            message['files'] = await self.upload_files(files)
+        payload = {'message': message}
+        updated = await self.client.call_api(f'{PATH_MESSAGES}/{message_id}', 'put', payload)
+        self.forget_entity(PATH_MESSAGES, message_id)
+        return self.decoded(Message, updated)
+
+    @atimed
+    async def upload_file(self, file: File) -> Dict:
+        file_info = await self.upload(file)
+        file.prepare(file_info['key'])
+        return file.as_dict()
+
+    @atimed
+    async def upload_files(self, files: List[File]) -> List[Dict]:
+        return await amap_ordered(self.upload_file, files, self.upload_workers)
+
+    @atimed
+    async def upload(self, file: File) -> Optional[Dict]:
+        scope = None
+        if self.uploads_cached():
+            # hashing a large file should not block the event loop
+            digest = await asyncio.get_running_loop().run_in_executor(None, file.digest)
+            scope = upload_scope(file, digest)
+            info = self.get_uploaded(scope)
+            if info is not None:
+                return info
+        # get pre-signed url
+        info = await self.client.call_api(PATH_UPLOAD, 'post', retryable=True)
+        # upload file
+        url = info['direct_url']
+        del info['direct_url']
+        body = MultipartEncoder(info, file, progress=file.progress, throughput=file.throughput)
+        await self.client.upload_stream(url, body)
+        self.set_uploaded(scope, info)
+        return info
@@ -0,0 +1,149 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, FIRST_EXCEPTION
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Iterator, List, Optional, Sequence, TypeVar
+
+from pachca_client.api.exceptions import PachcaAlreadyExists, PachcaClientEntryNotFound
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+class BatchResult:
+    def __init__(self, item: Any, result: Any = None, error: Optional[Exception] = None) -> None:
+        self.item = item
+        self.result = result
+        self.error = error
+
+    def __repr__(self) -> str:
+        if self.error is not None:
+            return f'BatchResult({self.item!r}, error={self.error!r})'
+        return f'BatchResult({self.item!r}, result={self.result!r})'
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def validate_workers(workers: int) -> None:
+    if workers < 1:
+        raise ValueError('workers should be greater 0')
+
+
+def map_ordered(func: Callable[[T], R], items: Sequence[T], workers: int) -> List[R]:
+    # Calls func for items in up to `workers` threads and returns results in the order of items.
+    # The first error cancels the calls which have not started yet and is raised
+    # when the running ones are finished.
+    validate_workers(workers)
+    if workers == 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as executor:
+        futures = [executor.submit(func, item) for item in items]
+        _, pending = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in pending:
+            future.cancel()
+    for future in futures:
+        if not future.cancelled() and future.exception() is not None:
+            raise future.exception()
+    return [future.result() for future in futures]
+
+
+def map_results(func: Callable[[T], R], items: Sequence[T], workers: int) -> List[BatchResult]:
+    # unlike map_ordered an error does not stop the batch, it is returned in the result of its item
+    def run(item: T) -> BatchResult:
+        try:
+            return BatchResult(item, result=func(item))
+        except Exception as e:
+            return BatchResult(item, error=e)
+    return map_ordered(run, items, workers)
+
+
+def imap_unordered(func: Callable[[T], R], items: Iterable[T], workers: int) -> Iterator[R]:
+    # Calls func for items in up to `workers` threads and yields results as they complete. The next item
+    # is read only when a thread is free, so a lazy iterable is never loaded at once. The first error is raised
+    # and the calls which have not started yet are cancelled.
+    validate_workers(workers)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = set()
+    items = iter(items)
+    exhausted = False
+    try:
+        while pending or not exhausted:
+            while not exhausted and len(pending) < workers:
+                try:
+                    pending.add(executor.submit(func, next(items)))
+                except StopIteration:
+                    exhausted = True
+            if pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def idempotent(func: Callable[[T], R]) -> Callable[[T], Optional[R]]:
+    # the entry is already in the requested state: it exists when added or is missing when removed
+    def inner(item: T) -> Optional[R]:
+        try:
+            return func(item)
+        except (PachcaAlreadyExists, PachcaClientEntryNotFound):
+            return None
+    return inner
+
+
+def aidempotent(func: Callable[[T], Awaitable[R]]) -> Callable[[T], Awaitable[Optional[R]]]:
+    async def inner(item: T) -> Optional[R]:
+        try:
+            return await func(item)
+        except (PachcaAlreadyExists, PachcaClientEntryNotFound):
+            return None
+    return inner
+
+
+async def amap_ordered(func: Callable[[T], Awaitable[R]], items: Sequence[T], workers: int) -> List[R]:
+    import asyncio
+    validate_workers(workers)
+    semaphore = asyncio.Semaphore(workers)
+
+    async def run(item: T) -> R:
+        async with semaphore:
+            return await func(item)
+    tasks = [asyncio.ensure_future(run(item)) for item in items]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def aimap_unordered(func: Callable[[T], Awaitable[R]], items: AsyncIterator[T], workers: int) -> AsyncIterator[R]:
+    import asyncio
+    validate_workers(workers)
+    pending = set()
+    exhausted = False
+    try:
+        while pending or not exhausted:
+            while not exhausted and len(pending) < workers:
+                try:
+                    pending.add(asyncio.ensure_future(func(await items.__anext__())))
+                except StopAsyncIteration:
+                    exhausted = True
+            if pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def amap_results(func: Callable[[T], Awaitable[R]], items: Sequence[T], workers: int) -> List[BatchResult]:
+    async def run(item: T) -> BatchResult:
+        try:
+            return BatchResult(item, result=await func(item))
+        except Exception as e:
+            return BatchResult(item, error=e)
+    return await amap_ordered(run, items, workers)
@@ -1,22 +1,221 @@
-from datetime import datetime
-from typing import Any
+import pickle
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional, Tuple
 
 
-class Cache:
-    def __init__(self, ttl: int = 60) -> None:
-        if ttl == 0:
-            raise ValueError("ttl should be greater 0")
-        self.cache = {}
-        self.ttl = {}
+def validate_ttl(ttl: int) -> None:
+    if ttl <= 0:
+        raise ValueError("ttl should be greater 0")
+
+
+def root_scope(scope: str) -> str:
+    # derived scopes like `chats:name` or `chats/1` share the ttl of `chats`
+    return scope.split('/', 1)[0].split(':', 1)[0]
+
+
+class BaseCache(ABC):
+    def __init__(self,
+                 ttl: int = 60,
+                 scope_ttl: Optional[Dict[str, int]] = None,
+                 stale_ttl: Optional[int] = None) -> None:
+        validate_ttl(ttl)
         self.max_ttl = ttl
+        self.scope_ttl = dict(scope_ttl or {})
+        for value in self.scope_ttl.values():
+            validate_ttl(value)
+        # how long expired entries are kept for lookup (stale-while-revalidate) before they are purged,
+        # the longest ttl by default
+        if stale_ttl is not None and stale_ttl < 0:
+            raise ValueError("stale_ttl should not be negative")
+        self.stale_ttl = max([ttl, *self.scope_ttl.values()]) if stale_ttl is None else stale_ttl
+        # hit: fresh value found, miss: nothing found or expired, stale: expired value returned by lookup,
+        # refresh: value stored
+        self.counters = Counter()
+        self.counters_lock = threading.Lock()
 
-    def update(self, scope: str, value: Any) -> None:
-        self.ttl[scope] = datetime.now().timestamp() + self.max_ttl
-        self.cache[scope] = value
+    def count(self, event: str) -> None:
+        with self.counters_lock:
+            self.counters[event] += 1
 
+    def counts(self) -> Dict[str, int]:
+        with self.counters_lock:
+            return dict(self.counters)
+
+    def get_ttl(self, scope: str) -> int:
+        if scope in self.scope_ttl:
+            return self.scope_ttl[scope]
+        return self.scope_ttl.get(root_scope(scope), self.max_ttl)
+
+    @abstractmethod
+    def delete(self, scope: str) -> None:
+        pass
+
+    @abstractmethod
     def get(self, scope: str) -> Any:
-        if scope not in self.cache:
-            return None
-        if self.ttl[scope] < datetime.now().timestamp():
+        pass
+
+    @abstractmethod
+    def lookup(self, scope: str) -> Tuple[Any, bool]:
+        # returns the value even if it has expired along with the expired flag
+        pass
+
+    @abstractmethod
+    def update(self, scope: str, value: Any, ttl: Optional[int] = None, keep_expiry: bool = False) -> None:
+        # ttl overrides the lifetime configured for the scope,
+        # with keep_expiry a cached value is replaced without extending its lifetime
+        pass
+
+
+class Cache(BaseCache):
+    # in-memory cache with LRU eviction, expired entries are purged lazily
+
+    def __init__(self,
+                 ttl: int = 60,
+                 max_size: Optional[int] = None,
+                 scope_ttl: Optional[Dict[str, int]] = None,
+                 stale_ttl: Optional[int] = None) -> None:
+        super().__init__(ttl, scope_ttl, stale_ttl)
+        if max_size is not None and max_size <= 0:
+            raise ValueError("max_size should be greater 0")
+        self.max_size = max_size
+        self.clock = time.monotonic
+        # scope -> (expires_at, value), the least recently used first
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def delete(self, scope: str) -> None:
+        with self.lock:
+            self.cache.pop(scope, None)
+
+    def get(self, scope: str) -> Any:
+        with self.lock:
+            entry = self.cache.get(scope)
+            if entry is None:
+                self.count('miss')
+                return None
+            now = self.clock()
+            if entry[0] < now:
+                # kept for lookup until the stale period is over
+                if entry[0] + self.stale_ttl < now:
+                    del self.cache[scope]
+                self.count('miss')
+                return None
+            self.cache.move_to_end(scope)
+            self.count('hit')
+            return entry[1]
+
+    def lookup(self, scope: str) -> Tuple[Any, bool]:
+        with self.lock:
+            entry = self.cache.get(scope)
+            if entry is None:
+                self.count('miss')
+                return None, True
+            self.cache.move_to_end(scope)
+            expired = entry[0] < self.clock()
+            self.count('stale' if expired else 'hit')
+            return entry[1], expired
+
+    def update(self, scope: str, value: Any, ttl: Optional[int] = None, keep_expiry: bool = False) -> None:
+        now = self.clock()
+        with self.lock:
+            entry = self.cache.get(scope) if keep_expiry else None
+            expires_at = entry[0] if entry is not None else now + (ttl or self.get_ttl(scope))
+            self.cache[scope] = (expires_at, value)
+            self.count('refresh')
+            self.cache.move_to_end(scope)
+            self.purge(now)
+
+    def purge(self, now: float) -> None:
+        # drop entries expired longer than stale_ttl ago from the LRU end, then evict over the size limit
+        while self.cache:
+            scope, (expires_at, _) = next(iter(self.cache.items()))
+            if expires_at + self.stale_ttl >= now and (self.max_size is None or len(self.cache) <= self.max_size):
+                break
+            del self.cache[scope]
+
+
+class SqliteCache(BaseCache):
+    # cache stored in a sqlite database, so it is shared by all processes on the host;
+    # values are pickled, the file should not be writable by untrusted users
+
+    def __init__(self,
+                 path: str,
+                 ttl: int = 60,
+                 scope_ttl: Optional[Dict[str, int]] = None,
+                 stale_ttl: Optional[int] = None) -> None:
+        super().__init__(ttl, scope_ttl, stale_ttl)
+        self.path = path
+        self.clock = time.time
+        self.local = threading.local()
+        # scope -> (expires_at, value) already unpickled by this process
+        self.loaded = {}
+        with self.connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS cache (scope TEXT PRIMARY KEY, expires_at REAL, value BLOB)')
+
+    def connect(self) -> sqlite3.Connection:
+        # sqlite connections can not be shared between threads
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute('PRAGMA journal_mode=WAL')
+            self.local.db = db
+        return db
+
+    def delete(self, scope: str) -> None:
+        self.loaded.pop(scope, None)
+        with self.connect() as db:
+            db.execute('DELETE FROM cache WHERE scope = ?', (scope, ))
+
+    def get(self, scope: str) -> Any:
+        value, expired = self.fetch(scope)
+        self.count('miss' if expired else 'hit')
+        if expired:
             return None
-        return self.cache[scope]
+        return value
+
+    def lookup(self, scope: str) -> Tuple[Any, bool]:
+        value, expired = self.fetch(scope)
+        if value is None:
+            self.count('miss')
+        else:
+            self.count('stale' if expired else 'hit')
+        return value, expired
+
+    def fetch(self, scope: str) -> Tuple[Any, bool]:
+        db = self.connect()
+        # a replaced row gets a new rowid, so (rowid, expires_at) changes even if the expiry is kept
+        row = db.execute('SELECT rowid, expires_at FROM cache WHERE scope = ?', (scope, )).fetchone()
+        if row is None:
+            self.loaded.pop(scope, None)
+            return None, True
+        expired = row[1] < self.clock()
+        # unpickle only if another process or thread has stored a new value
+        entry = self.loaded.get(scope)
+        if entry is not None and entry[0] == row:
+            return entry[1], expired
+        row = db.execute('SELECT rowid, expires_at, value FROM cache WHERE scope = ?', (scope, )).fetchone()
+        if row is None:
+            return None, True
+        value = pickle.loads(row[2])
+        self.loaded[scope] = ((row[0], row[1]), value)
+        return value, expired
+
+    def update(self, scope: str, value: Any, ttl: Optional[int] = None, keep_expiry: bool = False) -> None:
+        now = self.clock()
+        with self.connect() as db:
+            row = None
+            if keep_expiry:
+                row = db.execute('SELECT expires_at FROM cache WHERE scope = ?', (scope, )).fetchone()
+            expires_at = row[0] if row is not None else now + (ttl or self.get_ttl(scope))
+            cursor = db.execute('INSERT OR REPLACE INTO cache (scope, expires_at, value) VALUES (?, ?, ?)',
+                                (scope, expires_at, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+            db.execute('DELETE FROM cache WHERE expires_at < ?', (now - self.stale_ttl, ))
+        self.loaded[scope] = ((cursor.lastrowid, expires_at), value)
+        self.count('refresh')
@@ -1,15 +1,26 @@
 from http import HTTPStatus
-from json import JSONDecodeError
+import json
 import logging
-from requests import Request, Session, Response
+import threading
+import time
 from urllib.parse import urljoin
-from typing import Dict, List, Union, Optional, IO
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Mapping, Union, Optional, IO
 
+from pachca_client.api.codec import JsonCodec, default_codec
+from pachca_client.api.coalesce import SingleFlight, request_key
+from pachca_client.api.conditional import Entry, Validators, conditional_headers
 from pachca_client.api.exceptions import (PachcaClientUnexpectedResponseException,
                                           PachcaClientBadRequestException,
                                           PachcaClientException,
                                           PachcaClientEntryNotFound,
                                           PachcaAlreadyExists)
+from pachca_client.api.multipart import MultipartEncoder
+from pachca_client.api.ratelimit import TokenBucket
+from pachca_client.api.retry import RetryPolicy
+
+if TYPE_CHECKING:
+    # requests is imported by the first Client, short-lived scripts should not wait for it on import
+    from requests import Request, Response
 
 
 # Types
@@ -18,48 +29,112 @@ ApiJsonPayload = Optional[Union[Dict, List]]
 
 # Constants
 DEFAULT_TIMEOUT = 30
+# number of hosts with pooled connections
+DEFAULT_POOL_CONNECTIONS = 10
+# number of connections kept for a host
+DEFAULT_POOL_MAXSIZE = 10
+# passed as the body of a response which has not been decoded yet, None is the body which is not valid json
+_NOT_DECODED = object()
 
 logger = logging.getLogger(__name__)
 
 
-class Client:
+def body_size(body) -> int:
+    # streamed bodies report their length, bodies of unknown length are counted as empty
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode())
+    try:
+        return len(body)
+    except TypeError:
+        return 0
+
+
+class BufferedResponse:
+    # response read to the end which quacks like requests.Response,
+    # so BaseClient can check and decode responses of other HTTP libraries the same way
+
+    def __init__(self, status_code: int, content: bytes, encoding: str = 'utf-8', headers: Mapping = {}) -> None:
+        self.status_code = status_code
+        self.content = content
+        self.encoding = encoding
+        self.headers = headers
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors='replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class BaseClient:
     API_URL = 'https://api.pachca.com/api/shared/v1/'
 
-    def __init__(self, access_token: str, proxies: Dict = {}, raise_on_error: bool = True, timeout: int = DEFAULT_TIMEOUT) -> None:
+    def __init__(self,
+                 access_token: str,
+                 proxies: Dict = {},
+                 raise_on_error: bool = True,
+                 timeout: int = DEFAULT_TIMEOUT,
+                 retry: Optional[RetryPolicy] = None,
+                 rate_limiter: Optional[TokenBucket] = None,
+                 pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 keep_alive: bool = True,
+                 idle_timeout: Optional[float] = None,
+                 codec: Optional[JsonCodec] = None,
+                 coalesce: bool = False,
+                 conditional: bool = False) -> None:
+        if pool_connections < 1 or pool_maxsize < 1:
+            raise ValueError('pool size should be greater 0')
         self.headers = {
             'Authorization': f'Bearer {access_token}'
         }
+        if not keep_alive:
+            self.headers['Connection'] = 'close'
         self.proxies = proxies
         self.raise_on_error = raise_on_error
-        self.session = Session()
         self.timeout = timeout
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        # connections unused for longer are closed instead of being reused
+        self.idle_timeout = idle_timeout
+        self.retry = retry
+        # every request, including retries, waits for a token
+        self.rate_limiter = rate_limiter
+        self.codec = codec or default_codec()
+        # concurrent identical GET requests share one HTTP request and its result
+        self.coalesce = coalesce
+        # GET requests are sent with the validators of the previous response, 304 returns its data
+        self.validators = Validators() if conditional else None
+        # event -> callbacks, see add_hook
+        self.hooks = {
+            'request': [],
+            'response': [],
+            'retry': []
+        }
 
-    def call_api(self, path: str, method: str = 'get', payload: ApiJsonPayload = None) -> ApiResponse:
-        request = Request(method=method, url=self.request_url(path), headers=self.headers)
-        if payload:
-            if method == 'get':
-                request.params = payload
-            else:
-                request.json = payload
-        return self.call(request)
-
-    def call(self, request: Request) -> ApiResponse:
-        prequest = request.prepare()
-        response = self.session.send(prequest, proxies=self.proxies, timeout=self.timeout)
-        return self.handle_response(response)
+    def add_hook(self, event: str, hook: Callable) -> None:
+        # request: hook(method, url, attempt, size) is called before every attempt is sent
+        # response: hook(method, url, attempt, status_code, elapsed, size, error) is called after every attempt,
+        #   status_code is None if the request failed with error
+        # retry: hook(method, url, attempt, delay, status_code, error) is called before a request is repeated
+        if event not in self.hooks:
+            raise ValueError(f'unknown event {event}')
+        self.hooks[event].append(hook)
 
-    def check_response_status(self, response: Response) -> None:
+    def check_response_status(self, response: 'Response', body: Any = _NOT_DECODED) -> None:
+        # `body` is the already decoded response, it is decoded here only if not given
         if response.status_code in (HTTPStatus.OK, HTTPStatus.CREATED, HTTPStatus.NO_CONTENT):
             return
         if response.status_code >= 400 and response.status_code < 500:
-            error_message = ''
-            try:
-                body = response.json()
-                if isinstance(body, dict) and 'errors' in body:
-                    error_message = body['errors']
-                else:
-                    error_message = response.text
-            except ValueError:
+            if body is _NOT_DECODED:
+                body = self.decode(response)
+            if isinstance(body, dict) and 'errors' in body:
+                error_message = body['errors']
+            else:
                 error_message = response.text
             if response.status_code == HTTPStatus.NOT_FOUND:
                 raise PachcaClientEntryNotFound(error_message)
@@ -68,18 +143,31 @@ class Client:
             raise PachcaClientBadRequestException(error_message)
         raise PachcaClientUnexpectedResponseException(f"unexpected response with status code {response.status_code}")
 
-    def handle_response(self, response: Response) -> ApiResponse:
+    def decode(self, response: 'Response') -> Any:
+        # returns None if the response body does not contain valid json
         try:
-            self.check_response_status(response)
+            return self.codec.loads(response.content)
+        except ValueError:
+            return None
+
+    def handle_conditional(self, key: Any, entry: Optional[Entry], response: 'Response') -> ApiResponse:
+        # `entry` holds the validators sent with the request, a 304 response has no body to decode
+        if response.status_code == HTTPStatus.NOT_MODIFIED and entry is not None:
+            return entry[2]
+        data = self.handle_response(response)
+        if response.status_code == HTTPStatus.OK:
+            self.validators.store(key, response.headers, data)
+        return data
+
+    def handle_response(self, response: 'Response') -> ApiResponse:
+        # the body is decoded once for both the status check and the result
+        body = self.decode(response)
+        try:
+            self.check_response_status(response, body)
         except PachcaClientException as e:
             logger.error(f'request failed with {e}')
             if self.raise_on_error:
                 raise e
-        try:
-            body = response.json()
-        except JSONDecodeError:
-            # the response body does not contain valid json
-            return response.text
         if isinstance(body, dict):
             try:
                 return body['data']
@@ -90,7 +178,145 @@ class Client:
     def request_url(self, path: str) -> str:
         return urljoin(self.API_URL, path)
 
+    def retry_delay(self,
+                    method: str,
+                    url: str,
+                    attempt: int,
+                    retryable: Optional[bool] = None,
+                    status_code: Optional[int] = None,
+                    retry_after: Optional[str] = None,
+                    error: Optional[Exception] = None) -> Optional[float]:
+        # returns how long to wait before the next attempt or None if the request should not be repeated
+        if self.retry is None or not self.retry.should_retry(method, attempt, retryable, status_code):
+            return None
+        delay = self.retry.delay(attempt, retry_after)
+        self.run_hooks('retry', method=method, url=url, attempt=attempt, delay=delay, status_code=status_code, error=error)
+        return delay
+
+    def run_hooks(self, event: str, **kwargs) -> None:
+        for hook in self.hooks[event]:
+            hook(**kwargs)
+
+
+class Client(BaseClient):
+    # The client can be shared by threads: the connection pool is thread-safe,
+    # cookies are never stored and the rest of the state is guarded by the lock.
+    # Set pool_maxsize to the number of threads to avoid reconnecting.
+
+    def __init__(self,
+                 access_token: str,
+                 proxies: Dict = {},
+                 raise_on_error: bool = True,
+                 timeout: int = DEFAULT_TIMEOUT,
+                 retry: Optional[RetryPolicy] = None,
+                 rate_limiter: Optional[TokenBucket] = None,
+                 pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 pool_block: bool = False,
+                 keep_alive: bool = True,
+                 idle_timeout: Optional[float] = None,
+                 codec: Optional[JsonCodec] = None,
+                 coalesce: bool = False,
+                 conditional: bool = False) -> None:
+        super().__init__(access_token, proxies=proxies, raise_on_error=raise_on_error, timeout=timeout,
+                         retry=retry, rate_limiter=rate_limiter, pool_connections=pool_connections,
+                         pool_maxsize=pool_maxsize, keep_alive=keep_alive, idle_timeout=idle_timeout,
+                         codec=codec, coalesce=coalesce, conditional=conditional)
+        self.flights = SingleFlight()
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        from http.cookiejar import DefaultCookiePolicy
+        from requests import Request, Session
+        from requests.adapters import HTTPAdapter
+        from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+        from urllib3.util.request import ACCEPT_ENCODING
+
+        # kept on the client, so requests is imported once rather than on every call
+        self.request_class = Request
+        self.network_errors = (RequestsConnectionError, Timeout)
+
+        # every encoding urllib3 can decode, br and zstd are included when brotli and zstandard are installed
+        self.headers['Accept-Encoding'] = ACCEPT_ENCODING
+
+        self.session = Session()
+        # the API does not use cookies, the jar is left untouched by concurrent requests
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        # with pool_block threads wait for a free connection instead of opening extra ones
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def call_api(self, path: str, method: str = 'get', payload: ApiJsonPayload = None, retryable: Optional[bool] = None) -> ApiResponse:
+        request = self.request_class(method=method, url=self.request_url(path), headers=self.headers)
+        if payload:
+            if method == 'get':
+                request.params = payload
+            else:
+                # encoded by the codec instead of requests' stdlib json
+                request.headers = dict(self.headers, **{'Content-Type': 'application/json'})
+                request.data = self.codec.dumps(payload)
+        if self.coalesce and method == 'get':
+            return self.flights.do(request_key(path, payload), lambda: self.call(request, retryable))
+        return self.call(request, retryable)
+
+    def call(self, request: 'Request', retryable: Optional[bool] = None) -> ApiResponse:
+        prequest = request.prepare()
+        entry = None
+        if self.validators is not None and prequest.method == 'GET':
+            entry = self.validators.get(prequest.url)
+            prequest.headers.update(conditional_headers(entry))
+        attempt = 1
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            self.close_idle()
+            self.run_hooks('request', method=prequest.method, url=prequest.url, attempt=attempt, size=body_size(prequest.body))
+            started = time.monotonic()
+            try:
+                response = self.session.send(prequest, proxies=self.proxies, timeout=self.timeout)
+            except self.network_errors as e:
+                self.run_hooks('response', method=prequest.method, url=prequest.url, attempt=attempt,
+                               status_code=None, elapsed=time.monotonic() - started, size=0, error=e)
+                delay = self.retry_delay(prequest.method, prequest.url, attempt, retryable, error=e)
+                if delay is None:
+                    raise
+            else:
+                self.run_hooks('response', method=prequest.method, url=prequest.url, attempt=attempt,
+                               status_code=response.status_code, elapsed=time.monotonic() - started,
+                               size=len(response.content), error=None)
+                delay = self.retry_delay(prequest.method, prequest.url, attempt, retryable,
+                                         response.status_code, response.headers.get('Retry-After'))
+                if delay is None:
+                    if self.validators is not None and prequest.method == 'GET':
+                        return self.handle_conditional(prequest.url, entry, response)
+                    return self.handle_response(response)
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self) -> None:
+        self.session.close()
+
+    def close_idle(self) -> None:
+        # the server may have dropped connections idle for long, so they are not reused
+        if self.idle_timeout is None:
+            return
+        now = time.monotonic()
+        with self.lock:
+            idle = now - self.last_used
+            self.last_used = now
+        if idle > self.idle_timeout:
+            self.close()
+
     def upload(self, url: str, file: IO, data: Dict) -> ApiResponse:
-        request = Request(method='post', url=url, headers=self.headers, data=data)
+        request = self.request_class(method='post', url=url, headers=self.headers, data=data)
         request.files = {'file': file}
         return self.call(request)
+
+    def upload_stream(self, url: str, body: MultipartEncoder) -> ApiResponse:
+        # requests sends an iterable body with known length chunk by chunk without buffering it
+        headers = dict(self.headers)
+        headers['Content-Type'] = body.content_type
+        headers['Content-Length'] = str(len(body))
+        request = self.request_class(method='post', url=url, headers=headers, data=body)
+        return self.call(request)
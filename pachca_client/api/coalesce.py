@@ -0,0 +1,59 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+def request_key(path: str, params: Optional[Dict]) -> Tuple:
+    # the same path and params in any order are the same request
+    return path, tuple(sorted((str(name), repr(value)) for name, value in (params or {}).items()))
+
+
+class SingleFlight:
+    # concurrent calls with the same key wait for the first one and share its result or error
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Future()
+        if not leader:
+            return call.result()
+        try:
+            result = func()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+
+class AsyncSingleFlight:
+    # the same as SingleFlight for coroutines of one event loop; the call runs in its own task,
+    # so a cancelled caller, the first one included, does not cancel it for the others
+
+    def __init__(self) -> None:
+        self.calls = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        import asyncio
+        call = self.calls.get(key)
+        if call is None:
+            call = self.calls[key] = asyncio.ensure_future(func())
+            call.add_done_callback(lambda task: self.done(key, task))
+        return await asyncio.shield(call)
+
+    def done(self, key: Hashable, task: Any) -> None:
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        # all callers may have been cancelled, the exception should not be reported as never retrieved
+        if not task.cancelled():
+            task.exception()
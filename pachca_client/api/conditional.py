@@ -0,0 +1,52 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Mapping, Optional, Tuple
+
+# number of GET requests whose validators and data are kept
+DEFAULT_MAXSIZE = 256
+
+# (etag, last_modified, data)
+Entry = Tuple[Optional[str], Optional[str], Any]
+
+
+def conditional_headers(entry: Optional[Entry]) -> Dict:
+    headers = {}
+    if entry is None:
+        return headers
+    if entry[0]:
+        headers['If-None-Match'] = entry[0]
+    if entry[1]:
+        headers['If-Modified-Since'] = entry[1]
+    return headers
+
+
+class Validators:
+    # ETag/Last-Modified and the decoded data of GET responses by request, so an unchanged response comes back as
+    # 304 Not Modified and is neither transferred nor decoded again. The data is shared by the callers and should
+    # not be modified. The least recently used requests are dropped beyond maxsize.
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE) -> None:
+        if maxsize < 1:
+            raise ValueError('maxsize should be greater 0')
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Entry]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def store(self, key: Hashable, headers: Mapping, data: Any) -> None:
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        with self.lock:
+            if etag is None and last_modified is None:
+                self.entries.pop(key, None)
+                return
+            self.entries[key] = (etag, last_modified, data)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
@@ -1,12 +1,20 @@
+import hashlib
 import os
-from typing import Dict
+from typing import Callable, Dict, Optional
 
 TYPE_FILE = 'file'
 TYPE_IMAGE = 'image'
 
+DIGEST_CHUNK_SIZE = 1024 * 1024
+
 
 class File:
-    def __init__(self, file_path: str, name: str = '', file_type: str = TYPE_FILE) -> None:
+    def __init__(self,
+                 file_path: str,
+                 name: str = '',
+                 file_type: str = TYPE_FILE,
+                 progress: Optional[Callable[[int, int], None]] = None,
+                 throughput: Optional[Callable[[float], None]] = None) -> None:
         self.name = name
         if self.name == '':
             self.name = os.path.basename(file_path)
@@ -14,6 +22,11 @@ class File:
         self.type = file_type
         self.size = 0
         self.key = ''
+        # upload callbacks: progress(sent, total) and throughput(bytes_per_second)
+        self.progress = progress
+        self.throughput = throughput
+        # (size, mtime) of the file and its digest, so an unchanged file is not hashed again
+        self.digest_cache = None
 
     def as_dict(self) -> Dict:
         return {
@@ -23,6 +36,21 @@ class File:
             'size': self.size
         }
 
+    def digest(self) -> str:
+        # sha256 of the content computed by chunks, the file is never read into memory at once
+        stat = os.stat(self.path)
+        if self.digest_cache is not None and self.digest_cache[0] == (stat.st_size, stat.st_mtime_ns):
+            return self.digest_cache[1]
+        digest = hashlib.sha256()
+        with open(self.path, 'rb') as f:
+            while True:
+                chunk = f.read(DIGEST_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+        self.digest_cache = ((stat.st_size, stat.st_mtime_ns), digest.hexdigest())
+        return self.digest_cache[1]
+
     def get_size(self) -> int:
         return os.path.getsize(self.path)
 
@@ -0,0 +1,91 @@
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pachca_client.api.batch import BatchResult, map_results, validate_workers
+from pachca_client.api.paging import iter_pages
+
+
+class Checkpoints:
+    # Per chat id and time of the last synced message and the last_message_at of the chats seen by the last sync,
+    # stored in a sqlite database (':memory:' keeps them for the process only).
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        # one connection shared by the sync threads, so an in-memory database works as well
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS checkpoints (chat_id INTEGER PRIMARY KEY, message_id INTEGER, '
+                            'message_at TEXT)')
+            self.db.execute('CREATE TABLE IF NOT EXISTS chats_cursor (id INTEGER PRIMARY KEY CHECK (id = 1), '
+                            'last_message_at TEXT)')
+
+    def get(self, chat_id: int) -> Optional[Tuple[int, str]]:
+        with self.lock:
+            return self.db.execute('SELECT message_id, message_at FROM checkpoints WHERE chat_id = ?',
+                                   (chat_id, )).fetchone()
+
+    def set(self, chat_id: int, message_id: int, message_at: str) -> None:
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO checkpoints (chat_id, message_id, message_at) VALUES (?, ?, ?)',
+                            (chat_id, message_id, message_at))
+
+    def get_cursor(self) -> Optional[str]:
+        with self.lock:
+            row = self.db.execute('SELECT last_message_at FROM chats_cursor WHERE id = 1').fetchone()
+        return None if row is None else row[0]
+
+    def set_cursor(self, last_message_at: str) -> None:
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO chats_cursor (id, last_message_at) VALUES (1, ?)', (last_message_at, ))
+
+    def close(self) -> None:
+        self.db.close()
+
+
+class HistorySync:
+    # Fetches messages added since the previous run. Only chats with messages after the last seen last_message_at
+    # are listed, and messages of a chat are paged from the newest until an already synced id, chats are synced
+    # in up to `workers` threads. A chat checkpoint is moved after all its new messages have been handled,
+    # so messages handled before a failure or a crash are handled again by the next run.
+
+    def __init__(self, pachca: Any, checkpoints: Checkpoints, workers: int = 4, per: int = 50) -> None:
+        validate_workers(workers)
+        self.pachca = pachca
+        self.checkpoints = checkpoints
+        self.workers = workers
+        self.per = per
+
+    def run(self, handle: Callable[[int, List[Dict]], None]) -> List[BatchResult]:
+        # handle(chat_id, messages) is called from the sync threads for every page of new messages,
+        # newest first. Returns the number of new messages or the error for each chat.
+        cursor = self.checkpoints.get_cursor()
+        chats = list(self.pachca.iter_chats(per=self.per, last_message_at_after=cursor))
+        results = map_results(lambda chat_id: self.sync_chat(chat_id, handle), [chat['id'] for chat in chats], self.workers)
+        times = [chat.get('last_message_at') for chat in chats if chat.get('last_message_at')]
+        # chats which failed are listed again by the next run
+        if times and all(result.ok for result in results):
+            self.checkpoints.set_cursor(max(times))
+        return results
+
+    def sync_chat(self, chat_id: int, handle: Callable[[int, List[Dict]], None]) -> int:
+        checkpoint = self.checkpoints.get(chat_id)
+        last_id = checkpoint[0] if checkpoint is not None else 0
+        newest = None
+        count = 0
+        # messages are listed from the newest, so the first seen id means the rest are synced already
+        pages = iter_pages(lambda page: self.pachca.list_messages(chat_id, per=self.per, page=page) or [], self.per)
+        for page in pages:
+            new = [message for message in page if message['id'] > last_id]
+            if new:
+                latest = max(new, key=lambda message: message['id'])
+                if newest is None or latest['id'] > newest['id']:
+                    newest = latest
+                handle(chat_id, new)
+                count += len(new)
+            if len(new) != len(page):
+                break
+        if newest is not None:
+            self.checkpoints.set(chat_id, newest['id'], newest['created_at'])
+        return count
@@ -0,0 +1,118 @@
+from typing import Any, Dict, Optional, Tuple, Union
+
+
+class Model:
+    # Entry of an API response. Fields are read from the raw dict on first access and kept in slots,
+    # a projected model keeps only PROJECTION fields without the raw dict.
+
+    __slots__ = ('raw', )
+    FIELDS: Tuple[str, ...] = ()
+    PROJECTION: Tuple[str, ...] = ()
+
+    def __init__(self, raw: Optional[Dict] = None, **fields) -> None:
+        self.raw = raw
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def __getattr__(self, name: str) -> Any:
+        # called only for fields which have not been read yet
+        if name not in type(self).FIELDS:
+            raise AttributeError(name)
+        if self.raw is None:
+            # not projected
+            return None
+        value = self.raw.get(name)
+        setattr(self, name, value)
+        return value
+
+    def __getitem__(self, key: str) -> Any:
+        # models can be used where dicts were expected, missing fields raise KeyError as dicts do
+        if key in type(self).FIELDS:
+            try:
+                return object.__getattribute__(self, key)
+            except AttributeError:
+                pass
+        if self.raw is None:
+            raise KeyError(key)
+        return self.raw[key]
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, Model):
+            return type(self) is type(other) and self.as_dict() == other.as_dict()
+        if isinstance(other, dict):
+            return self.as_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in type(self).PROJECTION)
+        return f'{type(self).__name__}({fields})'
+
+    def __getstate__(self) -> Dict:
+        # only the fields which are set, reading the others would fill them with None
+        state = {name: getattr(self, name) for name in self.loaded()}
+        state['raw'] = self.raw
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def as_dict(self) -> Dict:
+        if self.raw is not None:
+            return self.raw
+        return {name: getattr(self, name) for name in self.loaded()}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def loaded(self) -> Tuple[str, ...]:
+        # fields which have been set or read already, unset slots are skipped without reading them
+        names = []
+        for name in type(self).FIELDS:
+            try:
+                object.__getattribute__(self, name)
+            except AttributeError:
+                continue
+            names.append(name)
+        return tuple(names)
+
+    def project(self) -> 'Model':
+        return type(self)(None, **{name: getattr(self, name) for name in type(self).PROJECTION})
+
+    @classmethod
+    def projected(cls, entry: Union[Dict, 'Model']) -> 'Model':
+        if not isinstance(entry, Model):
+            entry = cls(entry)
+        return entry.project()
+
+
+class Chat(Model):
+    __slots__ = ('id', 'name', 'owner_id', 'created_at', 'member_ids', 'group_tag_ids', 'channel', 'public',
+                 'last_message_at', 'meet_room_url')
+    FIELDS = __slots__
+    PROJECTION = ('id', 'name')
+
+
+class User(Model):
+    __slots__ = ('id', 'first_name', 'last_name', 'nickname', 'email', 'phone_number', 'department', 'role',
+                 'suspended', 'invite_status', 'list_tags', 'custom_properties', 'bot', 'created_at')
+    FIELDS = __slots__
+    PROJECTION = ('id', 'nickname')
+
+
+class Message(Model):
+    __slots__ = ('id', 'entity_type', 'entity_id', 'chat_id', 'content', 'user_id', 'created_at', 'files',
+                 'buttons', 'thread', 'forwarding', 'parent_message_id')
+    FIELDS = __slots__
+    PROJECTION = ('id', 'chat_id', 'user_id', 'created_at')
+
+
+class Reaction(Model):
+    __slots__ = ('user_id', 'created_at', 'code')
+    FIELDS = __slots__
+    PROJECTION = __slots__
@@ -0,0 +1,69 @@
+import time
+import uuid
+from typing import Callable, Dict, Iterator, Optional
+
+from pachca_client.api.file import File
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def quote_param(value: str) -> str:
+    # the same escaping as browsers use for multipart header parameters
+    return value.replace('\\', '\\\\').replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+
+
+class MultipartEncoder:
+    # multipart/form-data body which reads the file by chunks while it is being sent,
+    # so memory usage does not depend on the file size
+
+    def __init__(self,
+                 fields: Dict,
+                 file: File,
+                 field_name: str = 'file',
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 progress: Optional[Callable[[int, int], None]] = None,
+                 throughput: Optional[Callable[[float], None]] = None) -> None:
+        if chunk_size <= 0:
+            raise ValueError('chunk_size should be greater 0')
+        self.file = file
+        self.chunk_size = chunk_size
+        # progress(sent, total) and throughput(bytes_per_second) are called after every chunk
+        self.progress = progress
+        self.throughput = throughput
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+        parts = []
+        for name, value in fields.items():
+            parts.append(f'--{self.boundary}\r\n'
+                         f'Content-Disposition: form-data; name="{quote_param(str(name))}"\r\n\r\n'
+                         f'{value}\r\n')
+        parts.append(f'--{self.boundary}\r\n'
+                     f'Content-Disposition: form-data; name="{quote_param(field_name)}"; filename="{quote_param(file.name)}"\r\n'
+                     'Content-Type: application/octet-stream\r\n\r\n')
+        self.preamble = ''.join(parts).encode()
+        self.epilogue = f'\r\n--{self.boundary}--\r\n'.encode()
+        self.size = file.get_size()
+
+    def __len__(self) -> int:
+        return len(self.preamble) + self.size + len(self.epilogue)
+
+    def __iter__(self) -> Iterator[bytes]:
+        # every iteration reads the file from the start, so the body can be sent again on retry
+        yield self.preamble
+        sent = 0
+        started = time.monotonic()
+        with open(self.file.path, 'rb') as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+                sent += len(chunk)
+                self.report(sent, time.monotonic() - started)
+        yield self.epilogue
+
+    def report(self, sent: int, elapsed: float) -> None:
+        if self.progress is not None:
+            self.progress(sent, self.size)
+        if self.throughput is not None and elapsed > 0:
+            self.throughput(sent / elapsed)
@@ -0,0 +1,30 @@
+import http.client
+from typing import Optional
+from urllib.parse import urlsplit
+
+from pachca_client.api.client import ApiResponse, BaseClient, BufferedResponse, DEFAULT_TIMEOUT
+from pachca_client.api.payloads import CHAT_TYPE_DISCUSSION, PATH_MESSAGES, message_payload
+
+
+def send(access_token: str,
+         chat_id: int,
+         content: str,
+         chat_type: str = CHAT_TYPE_DISCUSSION,
+         parent_message_id: Optional[int] = None,
+         timeout: float = DEFAULT_TIMEOUT) -> ApiResponse:
+    # Sends one message with a single http.client request, for scripts which start, notify and exit.
+    # requests, the connection pool and the cache are not loaded, so chat_id should be an id, not a name.
+    client = BaseClient(access_token, timeout=timeout)
+    url = urlsplit(client.request_url(PATH_MESSAGES))
+    if url.scheme == 'https':
+        connection = http.client.HTTPSConnection(url.netloc, timeout=timeout)
+    else:
+        connection = http.client.HTTPConnection(url.netloc, timeout=timeout)
+    headers = dict(client.headers, **{'Content-Type': 'application/json'})
+    body = client.codec.dumps(message_payload(chat_id, content, chat_type, parent_message_id))
+    try:
+        connection.request('POST', url.path, body=body, headers=headers)
+        response = connection.getresponse()
+        return client.handle_response(BufferedResponse(response.status, response.read(), headers=response.headers))
+    finally:
+        connection.close()
@@ -0,0 +1,180 @@
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pachca_client.api.batch import validate_workers
+from pachca_client.api.exceptions import PachcaClientException, PachcaClientUnexpectedResponseException
+from pachca_client.api.retry import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+STATE_PENDING = 'pending'
+STATE_FAILED = 'failed'
+
+
+def transient(error: Exception) -> bool:
+    # network errors and 5xx responses may pass on the next attempt, other API errors will not
+    return not isinstance(error, PachcaClientException) or isinstance(error, PachcaClientUnexpectedResponseException)
+
+
+class Outbox:
+    # Messages stored in a sqlite database until the server accepts them, so they survive errors and restarts.
+    # A message is deleted only after it has been sent, a crash in between sends it again (at least once delivery).
+    # Messages of a chat are sent one at a time in the order they were added. Only one process should send
+    # messages of a database. Messages are pickled, the file should not be writable by untrusted users.
+
+    def __init__(self,
+                 path: str,
+                 workers: int = 4,
+                 retry: Optional[RetryPolicy] = None,
+                 poll_interval: float = 1.0) -> None:
+        validate_workers(workers)
+        self.path = path
+        # how many messages of different chats are sent concurrently
+        self.workers = workers
+        # a message is marked failed when the attempts are exhausted or the error is not transient
+        self.retry = retry or RetryPolicy(attempts=10, backoff=1, max_backoff=300)
+        # how often delayed retries are checked when nothing else wakes up the sender
+        self.poll_interval = poll_interval
+        self.clock = time.time
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        # ids of the messages being sent
+        self.inflight = set()
+        # set when a message is added or sent, so the sender does not wait for poll_interval
+        self.changed = threading.Event()
+        self.stopping = False
+        self.sender = None
+        self.executor = None
+        with self.connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, chat TEXT, message BLOB, '
+                       'attempts INTEGER DEFAULT 0, next_at REAL DEFAULT 0, state TEXT DEFAULT \'pending\', error TEXT)')
+            db.execute('CREATE INDEX IF NOT EXISTS outbox_chat ON outbox (state, chat, id)')
+
+    def connect(self) -> sqlite3.Connection:
+        # sqlite connections can not be shared between threads
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute('PRAGMA journal_mode=WAL')
+            # with WAL a commit survives a crash of the process without waiting for fsync
+            db.execute('PRAGMA synchronous=NORMAL')
+            self.local.db = db
+        return db
+
+    def put(self, chat: str, message: Dict) -> int:
+        with self.connect() as db:
+            cursor = db.execute('INSERT INTO outbox (chat, message) VALUES (?, ?)',
+                                (chat, pickle.dumps(message, pickle.HIGHEST_PROTOCOL)))
+        self.changed.set()
+        return cursor.lastrowid
+
+    def pending(self) -> int:
+        return self.connect().execute('SELECT COUNT(*) FROM outbox WHERE state = ?', (STATE_PENDING, )).fetchone()[0]
+
+    def failed(self) -> List[Tuple[int, Dict, str]]:
+        # (id, message, error) of the messages which will not be sent again unless requeued
+        rows = self.connect().execute('SELECT id, message, error FROM outbox WHERE state = ? ORDER BY id', (STATE_FAILED, ))
+        return [(row[0], pickle.loads(row[1]), row[2]) for row in rows]
+
+    def requeue(self, message_id: int) -> None:
+        with self.connect() as db:
+            db.execute('UPDATE outbox SET state = ?, attempts = 0, next_at = 0 WHERE id = ?', (STATE_PENDING, message_id))
+        self.changed.set()
+
+    def take(self) -> List[Tuple[int, Dict, int]]:
+        # the first pending message of each chat which is due and is not being sent already
+        entries = []
+        # read under the lock, otherwise a message sent and deleted meanwhile could be read and taken again
+        with self.lock:
+            free = self.workers - len(self.inflight)
+            if free <= 0:
+                return []
+            rows = self.connect().execute(
+                'SELECT id, message, attempts FROM outbox AS o WHERE state = ? AND next_at <= ? AND id = '
+                '(SELECT MIN(id) FROM outbox WHERE state = o.state AND chat = o.chat) ORDER BY id',
+                (STATE_PENDING, self.clock())).fetchall()
+            for row in rows:
+                if row[0] in self.inflight:
+                    continue
+                self.inflight.add(row[0])
+                entries.append((row[0], pickle.loads(row[1]), row[2]))
+                if len(entries) == free:
+                    break
+        return entries
+
+    def done(self, message_id: int) -> None:
+        with self.connect() as db:
+            db.execute('DELETE FROM outbox WHERE id = ?', (message_id, ))
+
+    def fail(self, message_id: int, attempt: int, error: Exception) -> None:
+        with self.connect() as db:
+            if self.retry.should_retry('POST', attempt, retryable=transient(error)):
+                db.execute('UPDATE outbox SET attempts = ?, next_at = ?, error = ? WHERE id = ?',
+                           (attempt, self.clock() + self.retry.delay(attempt), str(error), message_id))
+                return
+            logger.error(f'failed to send message {message_id} after {attempt} attempts: {error}')
+            db.execute('UPDATE outbox SET attempts = ?, state = ?, error = ? WHERE id = ?',
+                       (attempt, STATE_FAILED, str(error), message_id))
+
+    def deliver(self, send: Callable[[Dict], Any], message_id: int, message: Dict, attempts: int) -> None:
+        try:
+            try:
+                send(message)
+            except Exception as e:
+                self.fail(message_id, attempts + 1, e)
+            else:
+                self.done(message_id)
+        except Exception as e:
+            # the message stays pending and is sent again
+            logger.error(f'failed to update message {message_id} in the outbox: {e}')
+        finally:
+            with self.lock:
+                self.inflight.discard(message_id)
+            self.changed.set()
+
+    def start(self, send: Callable[[Dict], Any]) -> None:
+        # messages left by a previous run are sent as well
+        if self.sender is not None:
+            return
+        self.stopping = False
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.sender = threading.Thread(target=self.run, args=(send, ), daemon=True)
+        self.sender.start()
+
+    def run(self, send: Callable[[Dict], Any]) -> None:
+        while not self.stopping:
+            # cleared before the query, so a message added meanwhile is not missed
+            self.changed.clear()
+            try:
+                entries = self.take()
+            except Exception as e:
+                logger.error(f'failed to read the outbox: {e}')
+                entries = []
+            for entry in entries:
+                self.executor.submit(self.deliver, send, *entry)
+            if not entries:
+                self.changed.wait(self.poll_interval)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        # messages being sent are finished, the rest stay in the database
+        if self.sender is None:
+            return
+        self.stopping = True
+        self.changed.set()
+        self.sender.join(timeout)
+        self.executor.shutdown(wait=True)
+        self.sender = None
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        # waits until every message is sent or failed, returns False on timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending() > 0:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
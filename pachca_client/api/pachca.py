@@ -1,21 +1,90 @@
-from typing import Any, Optional, Dict, List, Union
+import functools
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Hashable, Iterator, Optional, Dict, List, Tuple, Union
 
-from pachca_client.api.client import Client
-from pachca_client.api.cache import Cache
+from pachca_client.api.client import BaseClient
+from pachca_client.api.batch import BatchResult, idempotent, imap_unordered, map_ordered, map_results, validate_workers
+from pachca_client.api.cache import BaseCache, validate_ttl
 from pachca_client.api.file import File
+from pachca_client.api.models import Chat, Message, Model, Reaction, User
+from pachca_client.api.multipart import MultipartEncoder
 from pachca_client.api.exceptions import PachcaClientNotResolved
+from pachca_client.api.outbox import Outbox
+from pachca_client.api.paging import iter_pages, validate_window
+from pachca_client.api.payloads import (message_payload,
+                                        CHAT_TYPE_DISCUSSION,
+                                        CHAT_TYPE_USER,
+                                        PATH_CHATS,
+                                        PATH_MESSAGES,
+                                        PATH_UPLOAD,
+                                        PATH_USERS)
 
-CHAT_TYPE_DISCUSSION = 'discussion'
-CHAT_TYPE_THREAD = 'thread'
-CHAT_TYPE_USER = 'user'
 
-PATH_CHATS = 'chats'
-PATH_MESSAGES = 'messages'
-PATH_UPLOAD = 'uploads'
-PATH_USERS = 'users'
+# fields used to resolve names of cached entries
+INDEX_FIELDS = {
+    PATH_CHATS: 'name',
+    PATH_USERS: 'nickname'
+}
+
+# models the cached entries are projected to
+INDEX_MODELS = {
+    PATH_CHATS: Chat,
+    PATH_USERS: User
+}
+
+# lists used to resolve names of message recipients
+ENTITY_SCOPES = {
+    CHAT_TYPE_DISCUSSION: PATH_CHATS,
+    CHAT_TYPE_USER: PATH_USERS
+}
+
+logger = logging.getLogger(__name__)
+
+
+def build_index(entries: List[Dict], field: str) -> Dict:
+    index = {}
+    for entry in entries:
+        # the first entry wins the same way as a linear scan does
+        index.setdefault(entry[field], entry['id'])
+    return index
+
+
+def index_scope(scope: str) -> str:
+    return f'{scope}:{INDEX_FIELDS[scope]}'
+
+
+def named_scopes(messages: List[Dict]) -> List[str]:
+    scopes = set()
+    for message in messages:
+        chat_type = message.get('chat_type', CHAT_TYPE_DISCUSSION)
+        if isinstance(message.get('chat_id'), str) and chat_type in ENTITY_SCOPES:
+            scopes.add(ENTITY_SCOPES[chat_type])
+    return sorted(scopes)
+
+
+def shared_files(messages: List[Dict]) -> List[File]:
+    files = {}
+    for message in messages:
+        for file in message.get('files', []):
+            files.setdefault(id(file), file)
+    return list(files.values())
+
+
+def upload_scope(file: File, digest: str) -> str:
+    # uploads are reused for the same content sent with the same name
+    return f'{PATH_UPLOAD}/{digest}:{file.get_size()}:{file.name}'
+
+
+def prefetch_window(prefetch: bool) -> int:
+    # with prefetch the next page is requested while the current one is consumed
+    return 2 if prefetch else 1
 
 
 def validate_paging(func):
+    @functools.wraps(func)
     def inner(*args, **kwargs):
         if 'page' in kwargs and kwargs['page'] < 0:
             raise ValueError('page should be greater 1')
@@ -26,62 +95,361 @@ def validate_paging(func):
     return inner
 
 
-class Pachca:
-    def __init__(self, client: Client, cache: Cache = None) -> None:
+def timed(func):
+    # reports how long the method has taken to the `call` hooks
+    @functools.wraps(func)
+    def inner(self, *args, **kwargs):
+        if not self.hooks['call']:
+            return func(self, *args, **kwargs)
+        started = time.monotonic()
+        error = None
+        try:
+            return func(self, *args, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.run_hooks('call', method=func.__name__, elapsed=time.monotonic() - started, error=error)
+
+    return inner
+
+
+class BasePachca:
+    def __init__(self,
+                 client: BaseClient,
+                 cache: Optional[BaseCache] = None,
+                 page_window: int = 1,
+                 stale_while_revalidate: bool = False,
+                 upload_workers: int = 4,
+                 upload_ttl: Optional[int] = None,
+                 models: bool = False,
+                 cache_raw: bool = False,
+                 entity_ttl: Optional[int] = None) -> None:
+        validate_window(page_window)
+        validate_workers(upload_workers)
+        for ttl in (upload_ttl, entity_ttl):
+            if ttl is not None:
+                validate_ttl(ttl)
         self.client = client
         self.cache = cache
+        # how many pages list_all_* request concurrently
+        self.page_window = page_window
+        # serve expired chats/users while they are reloaded in the background
+        self.stale_while_revalidate = stale_while_revalidate
+        # how many files of a message are uploaded concurrently
+        self.upload_workers = upload_workers
+        # how long uploaded files are reused, should not exceed the time the server keeps them
+        self.upload_ttl = upload_ttl
+        # return Chat, User, Message and Reaction models instead of dicts
+        self.models = models
+        # cache full chats/users instead of only the fields needed to resolve names
+        self.cache_raw = cache_raw
+        # how long get_chat/get_message responses are reused, they are dropped on update or delete
+        self.entity_ttl = entity_ttl
+        # event -> callbacks, see add_hook
+        self.hooks = {
+            'call': []
+        }
+
+    def add_hook(self, event: str, hook: Callable) -> None:
+        # call: hook(method, elapsed, error) is called after a public method returns or raises
+        if event not in self.hooks:
+            raise ValueError(f'unknown event {event}')
+        self.hooks[event].append(hook)
+
+    def run_hooks(self, event: str, **kwargs) -> None:
+        for hook in self.hooks[event]:
+            hook(**kwargs)
+
+    def cached_entries(self, scope: str, entries: List) -> List:
+        if self.cache_raw:
+            return list(entries)
+        return [INDEX_MODELS[scope].projected(entry) for entry in entries]
+
+    def decoded(self, model: type, response: Any) -> Any:
+        # models read the fields from the response lazily, the dict is not copied
+        if not self.models:
+            return response
+        if isinstance(response, list):
+            return [model(entry) for entry in response]
+        if isinstance(response, dict):
+            return model(response)
+        return response
+
+    def get_cached(self, scope: str) -> Any:
+        if self.cache is None:
+            return None
+        return self.cache.get(scope)
+
+    def lookup_cached(self, scope: str) -> Tuple[Any, bool]:
+        if self.cache is None:
+            return None, True
+        return self.cache.lookup(scope)
+
+    def batch_payload(self, message: Dict, indexes: Dict[str, Any], uploads: Dict[int, BatchResult]) -> Dict:
+        # builds the payload of a send_many message from the preloaded indexes and uploaded files
+        message = dict(message)
+        chat_id = message.pop('chat_id')
+        files = message.pop('files', [])
+        chat_type = message.get('chat_type', CHAT_TYPE_DISCUSSION)
+        if isinstance(chat_id, str) and chat_type in ENTITY_SCOPES:
+            index = indexes[ENTITY_SCOPES[chat_type]]
+            if isinstance(index, Exception):
+                raise index
+            if chat_id not in index:
+                raise PachcaClientNotResolved(chat_id)
+            chat_id = index[chat_id]
+        attachments = []
+        for file in files:
+            upload = uploads[id(file)]
+            if not upload.ok:
+                raise upload.error
+            attachments.append(upload.result)
+        return message_payload(chat_id, files=attachments, **message)
+
+    def get_uploaded(self, scope: Optional[str]) -> Optional[Dict]:
+        if scope is None:
+            return None
+        info = self.get_cached(scope)
+        if info is None:
+            return None
+        return dict(info)
+
+    def set_uploaded(self, scope: Optional[str], info: Dict) -> None:
+        if scope is not None:
+            self.cache.update(scope, dict(info), ttl=self.upload_ttl)
+
+    def get_entity(self, path: str, entity_id: int) -> Optional[Dict]:
+        if self.entity_ttl is None:
+            return None
+        entity = self.get_cached(f'{path}/{entity_id}')
+        if entity is None:
+            return None
+        # the caller may modify the response
+        return dict(entity)
+
+    def set_entity(self, path: str, entity_id: int, entity: Any) -> None:
+        if self.entity_ttl is not None and self.cache is not None and isinstance(entity, dict):
+            self.cache.update(f'{path}/{entity_id}', dict(entity), ttl=self.entity_ttl)
+
+    def forget_entity(self, path: str, entity_id: int) -> None:
+        if self.entity_ttl is not None and self.cache is not None:
+            self.cache.delete(f'{path}/{entity_id}')
+
+    def uploads_cached(self) -> bool:
+        return self.cache is not None and self.upload_ttl is not None
+
+    def loaded_index(self, scope: str, entries: List) -> Dict:
+        # the index has been built by set_cached if the cache is enabled
+        index = self.get_cached(index_scope(scope))
+        if index is None:
+            index = build_index(entries, INDEX_FIELDS[scope])
+        return index
+
+    def patch_cached(self, scope: str, entries: List[Dict]) -> None:
+        # merges created or updated entries into the cached list instead of a full re-crawl
+        entries = [entry for entry in entries if isinstance(entry, (dict, Model)) and entry.get('id') is not None]
+        items = self.get_cached(scope)
+        index = self.get_cached(index_scope(scope))
+        if items is None or index is None or len(entries) == 0:
+            # nothing to patch, the list is loaded on the next lookup
+            return
+        field = INDEX_FIELDS[scope]
+        items = list(items)
+        index = dict(index)
+        positions = {item['id']: position for position, item in enumerate(items)}
+        renamed = False
+        for entry in entries:
+            position = positions.get(entry['id'])
+            if position is None:
+                positions[entry['id']] = len(items)
+                items.append(entry)
+                index.setdefault(entry[field], entry['id'])
+                continue
+            renamed = renamed or items[position][field] != entry[field]
+            items[position] = entry
+        if renamed:
+            index = build_index(items, field)
+        # the patched list expires when the loaded one would, so changes made by others are still picked up
+        self.cache.update(scope, self.cached_entries(scope, items), keep_expiry=True)
+        self.cache.update(index_scope(scope), index, keep_expiry=True)
+
+    def set_cached(self, scope: str, value: Any) -> Any:
+        if self.cache is None:
+            return value
+        if scope in INDEX_FIELDS:
+            self.cache.update(scope, self.cached_entries(scope, value))
+            self.cache.update(index_scope(scope), build_index(value, INDEX_FIELDS[scope]))
+        else:
+            self.cache.update(scope, value)
+        return value
 
+
+class Pachca(BasePachca):
+    def __init__(self,
+                 client: BaseClient,
+                 cache: Optional[BaseCache] = None,
+                 page_window: int = 1,
+                 stale_while_revalidate: bool = False,
+                 upload_workers: int = 4,
+                 upload_ttl: Optional[int] = None,
+                 models: bool = False,
+                 cache_raw: bool = False,
+                 entity_ttl: Optional[int] = None,
+                 outbox: Optional[Outbox] = None) -> None:
+        super().__init__(client, cache, page_window, stale_while_revalidate, upload_workers, upload_ttl, models, cache_raw,
+                         entity_ttl)
+        # only one crawl of chats/users runs at a time, other callers wait for it
+        self.locks = {scope: threading.Lock() for scope in INDEX_FIELDS}
+        # messages added by enqueue_message are sent in the background by new_message
+        self.outbox = outbox
+        if outbox is not None:
+            outbox.start(self.send_enqueued)
+
+    @timed
+    def add_reactions(self, reactions: List[Tuple[int, str]], workers: int = 4) -> List[BatchResult]:
+        # Adds reactions given as (message_id, code) in up to `workers` threads, requests share the client
+        # rate limit. A reaction which exists already counts as added, errors are returned in the results.
+        return map_results(idempotent(lambda reaction: self.new_reaction(*reaction)), reactions, workers)
+
+    @timed
+    def collect_reactions(self,
+                          chat_id: int,
+                          workers: int = 4,
+                          per: int = 50,
+                          key: Optional[Callable[[Dict], Hashable]] = None,
+                          select: Optional[Callable[[Dict], bool]] = None) -> Counter:
+        # Counts reactions of the chat messages by code, or by key(reaction). Message pages are read ahead while
+        # reactions of up to `workers` messages are fetched, and only the counters are kept, not the messages.
+        # The list of messages does not tell which have reactions, `select` skips the messages not worth fetching.
+        key = key or (lambda reaction: reaction['code'])
+
+        def count(message_id: int) -> Counter:
+            return Counter(key(reaction) for reaction in self.iter_reactions(message_id, per=per))
+        message_ids = (message['id'] for message in self.iter_messages(chat_id, per=per, prefetch=True)
+                       if select is None or select(message))
+        counts = Counter()
+        for reactions in imap_unordered(count, message_ids, workers):
+            counts.update(reactions)
+        return counts
+
+    @timed
     def delete_message(self, message_id: int) -> None:
-        return self.client.call_api(f'{PATH_MESSAGES}/{message_id}', method='delete')
+        response = self.client.call_api(f'{PATH_MESSAGES}/{message_id}', method='delete')
+        self.forget_entity(PATH_MESSAGES, message_id)
+        return response
 
+    @timed
     def delete_reaction(self, message_id: int, code: str) -> None:
         payload = {
             'code': code
         }
         self.client.call_api(f'{PATH_MESSAGES}/{message_id}/reactions', method='delete', payload=payload)
 
-    def get_cached(self, scope: str) -> Any:
-        if self.cache is None:
-            return None
-        return self.cache.get(scope)
+    @timed
+    def enqueue_message(self,
+                        chat_id: Union[str, int],
+                        content: str,
+                        chat_type: str = CHAT_TYPE_DISCUSSION,
+                        parent_message_id: int = None,
+                        skip_invite_mentions: bool = False,
+                        link_preview: bool = False,
+                        buttons: List[List[Dict]] = [],
+                        files: List[File] = []) -> int:
+        # Stores the message in the outbox and returns its id in the outbox, the message is sent later
+        # with the new_message arguments. Names are resolved and files are uploaded when it is sent,
+        # the progress and throughput callbacks of the files are not kept.
+        if self.outbox is None:
+            raise ValueError('outbox is not configured')
+        message = {
+            'chat_id': chat_id,
+            'content': content,
+            'chat_type': chat_type,
+            'parent_message_id': parent_message_id,
+            'skip_invite_mentions': skip_invite_mentions,
+            'link_preview': link_preview,
+            'buttons': buttons,
+            # File objects hold callbacks which can not be pickled
+            'files': [{'path': file.path, 'name': file.name, 'file_type': file.type} for file in files]
+        }
+        return self.outbox.put(f'{chat_type}:{chat_id}', message)
+
+    def send_enqueued(self, message: Dict) -> Optional[Dict]:
+        files = [File(file['path'], file['name'], file['file_type']) for file in message['files']]
+        return self.new_message(**dict(message, files=files))
 
+    @timed
     def get_message(self, message_id) -> Optional[Dict]:
-        return self.client.call_api(f'{PATH_MESSAGES}/{message_id}')
+        message = self.get_entity(PATH_MESSAGES, message_id)
+        if message is None:
+            message = self.client.call_api(f'{PATH_MESSAGES}/{message_id}')
+            self.set_entity(PATH_MESSAGES, message_id, message)
+        return self.decoded(Message, message)
 
+    @timed
     def get_chat(self, chat_id: Union[str, int]) -> Optional[Dict]:
         if isinstance(chat_id, str):
             chat_id = self.resolve_chat_name(chat_id)
             if chat_id is None:
                 raise PachcaClientNotResolved(chat_id)
-        path = f'{PATH_CHATS}/{chat_id}'
-        return self.client.call_api(path)
+        chat = self.get_entity(PATH_CHATS, chat_id)
+        if chat is None:
+            chat = self.client.call_api(f'{PATH_CHATS}/{chat_id}')
+            self.set_entity(PATH_CHATS, chat_id, chat)
+        return self.decoded(Chat, chat)
 
     @validate_paging
-    def list_all_chats(self, per: int = 50) -> List:
-        page = 1
+    def iter_chats(self,
+                   per: int = 50,
+                   availability: str = 'is_member',
+                   last_message_at_after: Optional[str] = None,
+                   last_message_at_before: Optional[str] = None,
+                   prefetch: bool = False) -> Iterator[Dict]:
+        def fetch(page: int) -> List:
+            return self.list_chats(per, page, availability, last_message_at_after, last_message_at_before)
+        for response in iter_pages(fetch, per, prefetch_window(prefetch)):
+            yield from response
+
+    @validate_paging
+    def iter_messages(self, chat_id: int, per: int = 50, prefetch: bool = False) -> Iterator[Dict]:
+        def fetch(page: int) -> List:
+            return self.list_messages(chat_id, per=per, page=page) or []
+        for response in iter_pages(fetch, per, prefetch_window(prefetch)):
+            yield from response
+
+    @validate_paging
+    def iter_reactions(self, message_id: int, per: int = 50, prefetch: bool = False) -> Iterator[Dict]:
+        def fetch(page: int) -> List:
+            return self.list_reactions(message_id, per=per, page=page) or []
+        for response in iter_pages(fetch, per, prefetch_window(prefetch)):
+            yield from response
+
+    @validate_paging
+    def iter_users(self, per: int = 50, query: Optional[str] = None, prefetch: bool = False) -> Iterator[Dict]:
+        def fetch(page: int) -> List:
+            return self.list_users(per=per, page=page, query=query)
+        for response in iter_pages(fetch, per, prefetch_window(prefetch)):
+            yield from response
+
+    @timed
+    @validate_paging
+    def list_all_chats(self, per: int = 50, window: Optional[int] = None) -> List:
         chats = []
-        while True:
-            response = self.list_chats(per, page)
+        pages = iter_pages(lambda page: self.list_chats(per, page), per, window or self.page_window)
+        for response in pages:
             chats.extend(response)
-            if len(response) == per:
-                page += 1
-                continue
-            break
         return self.set_cached(PATH_CHATS, chats)
 
+    @timed
     @validate_paging
-    def list_all_users(self, per: int = 50) -> List:
-        page = 1
+    def list_all_users(self, per: int = 50, window: Optional[int] = None) -> List:
         users = []
-        while True:
-            response = self.list_users(per=per, page=page)
+        pages = iter_pages(lambda page: self.list_users(per=per, page=page), per, window or self.page_window)
+        for response in pages:
             users.extend(response)
-            if len(response) == per:
-                page += 1
-                continue
-            break
         return self.set_cached(PATH_USERS, users)
 
+    @timed
     @validate_paging
     def list_chats(self,
                    per: int = 50,
@@ -100,8 +468,9 @@ class Pachca:
         response = self.client.call_api(path=PATH_CHATS, payload=payload)
         if response is None:
             return []
-        return response
+        return self.decoded(Chat, response)
 
+    @timed
     @validate_paging
     def list_messages(self,
                       chat_id: int,
@@ -111,8 +480,9 @@ class Pachca:
             'chat_id': chat_id,
             'per': per,
             'page': page}
-        return self.client.call_api(path=PATH_MESSAGES, payload=payload)
+        return self.decoded(Message, self.client.call_api(path=PATH_MESSAGES, payload=payload))
 
+    @timed
     @validate_paging
     def list_reactions(self,
                        message_id: int,
@@ -122,8 +492,9 @@ class Pachca:
             'per': per,
             'page': page
         }
-        return self.client.call_api(path=f'{PATH_MESSAGES}/{message_id}/reactions', payload=payload)
+        return self.decoded(Reaction, self.client.call_api(path=f'{PATH_MESSAGES}/{message_id}/reactions', payload=payload))
 
+    @timed
     @validate_paging
     def list_users(self,
                    per: int = 50,
@@ -138,8 +509,9 @@ class Pachca:
         response = self.client.call_api(path=PATH_USERS, payload=payload)
         if response is None:
             return []
-        return response
+        return self.decoded(User, response)
 
+    @timed
     def new_chat(self,
                  name: str,
                  members: List[int],
@@ -157,11 +529,11 @@ class Pachca:
         payload = {
             'chat': chat
         }
-        response = self.client.call_api(PATH_CHATS, 'post', payload)
-        if self.cache is not None:
-            self.list_all_chats()
+        response = self.decoded(Chat, self.client.call_api(PATH_CHATS, 'post', payload))
+        self.patch_cached(PATH_CHATS, [response])
         return response
 
+    @timed
     def new_message(self,
                     chat_id: Union[str, int],
                     content: str,
@@ -178,65 +550,110 @@ class Pachca:
                 chat_id = self.resolve_user_name(chat_id)
             if chat_id is None:
                 raise PachcaClientNotResolved(chat_id)
-        message = {
-            'entity_type': chat_type,
-            'content': content,
-            'entity_id': chat_id,
-            'skip_invite_mentions': skip_invite_mentions}
-        if parent_message_id is not None:
-            message['parent_message_id'] = parent_message_id
+        attachments = []
         if len(files) != 0:
-            message['files'] = []
-            for file in files:
-                file_info = self.upload(file)
-                file.prepare(file_info['key'])
-                message['files'].append(file.as_dict())
-        if len(buttons) != 0:
-            message['buttons'] = buttons
-        payload = {
-            'message': message,
-            'link_preview': link_preview}
-        return self.client.call_api(path=PATH_MESSAGES, method='post', payload=payload)
+            attachments = self.upload_files(files)
+        payload = message_payload(chat_id, content, chat_type, parent_message_id, skip_invite_mentions,
+                                  link_preview, buttons, attachments)
+        return self.decoded(Message, self.client.call_api(path=PATH_MESSAGES, method='post', payload=payload))
 
+    @timed
     def new_reaction(self, message_id: int, code: str) -> None:
         payload = {
             'code': code
         }
         self.client.call_api(f'{PATH_MESSAGES}/{message_id}/reactions', method='post', payload=payload)
 
+    @timed
     def new_thread(self, message_id: int) -> Optional[Dict]:
         return self.client.call_api(f'{PATH_MESSAGES}/{message_id}/thread', method='post')
 
+    @timed
     def pin_message(self, message_id: int) -> None:
         return self.client.call_api(f'{PATH_MESSAGES}/{message_id}/pin', method='post')
 
+    @timed
+    def pin_messages(self, message_ids: List[int], workers: int = 4) -> List[BatchResult]:
+        return map_results(idempotent(self.pin_message), message_ids, workers)
+
+    def get_index(self, scope: str, fetch: Callable[[], List]) -> Dict:
+        if self.cache is None:
+            return build_index(fetch(), INDEX_FIELDS[scope])
+        index, expired = self.lookup_cached(index_scope(scope))
+        if index is not None and not expired:
+            return index
+        if index is not None and self.stale_while_revalidate:
+            self.revalidate(scope, fetch)
+            return index
+        with self.locks[scope]:
+            # the list could be loaded while waiting for the lock
+            index = self.get_cached(index_scope(scope))
+            if index is not None:
+                return index
+            return self.loaded_index(scope, fetch())
+
+    @timed
+    def refresh_chats(self, last_message_at_after: str) -> List:
+        # updates the cached chats with only the chats changed since the given time
+        chats = list(self.iter_chats(last_message_at_after=last_message_at_after))
+        self.patch_cached(PATH_CHATS, chats)
+        return chats
+
+    @timed
+    def remove_reactions(self, reactions: List[Tuple[int, str]], workers: int = 4) -> List[BatchResult]:
+        # the same as add_reactions, a missing reaction counts as removed
+        return map_results(idempotent(lambda reaction: self.delete_reaction(*reaction)), reactions, workers)
+
+    @timed
     def resolve_chat_name(self, name: str) -> Optional[int]:
-        chats = self.get_cached(PATH_CHATS)
-        if chats is None:
-            chats = self.list_all_chats()
-        for chat in chats:
-            if chat['name'] == name:
-                return chat['id']
-        return None
+        return self.get_index(PATH_CHATS, self.list_all_chats).get(name)
 
+    @timed
     def resolve_user_name(self, name: str) -> Optional[int]:
-        users = self.get_cached(PATH_USERS)
-        if users is None:
-            users = self.list_all_users()
-        for user in users:
-            if user['nickname'] == name:
-                return user['id']
-        return None
+        return self.get_index(PATH_USERS, self.list_all_users).get(name)
 
-    def set_cached(self, scope: str, value: Any) -> Any:
-        if self.cache is None:
-            return value
-        self.cache.update(scope, value)
-        return value
+    def revalidate(self, scope: str, fetch: Callable[[], List]) -> None:
+        lock = self.locks[scope]
+        if not lock.acquire(blocking=False):
+            # the list is being loaded already
+            return
+
+        def run():
+            try:
+                fetch()
+            except Exception as e:
+                logger.error(f'failed to refresh {scope}: {e}')
+            finally:
+                lock.release()
+        threading.Thread(target=run, daemon=True).start()
 
+    @timed
+    def send_many(self, messages: List[Dict], workers: int = 4) -> List[BatchResult]:
+        # Sends messages given as new_message arguments in up to `workers` threads.
+        # Names are resolved with a single load of chats/users and a File passed to several
+        # messages is uploaded once. Errors are returned in the results instead of being raised.
+        indexes = {}
+        for scope in named_scopes(messages):
+            try:
+                indexes[scope] = self.get_index(scope, self.list_all_chats if scope == PATH_CHATS else self.list_all_users)
+            except Exception as e:
+                indexes[scope] = e
+        uploads = {id(upload.item): upload for upload in map_results(self.upload_file, shared_files(messages), self.upload_workers)}
+
+        def send(message: Dict) -> Optional[Dict]:
+            payload = self.batch_payload(message, indexes, uploads)
+            return self.decoded(Message, self.client.call_api(path=PATH_MESSAGES, method='post', payload=payload))
+        return map_results(send, messages, workers)
+
+    @timed
     def unpin_message(self, message_id: int) -> None:
         return self.client.call_api(f'{PATH_MESSAGES}/{message_id}/pin', method='delete')
 
+    @timed
+    def unpin_messages(self, message_ids: List[int], workers: int = 4) -> List[BatchResult]:
+        return map_results(idempotent(self.unpin_message), message_ids, workers)
+
+    @timed
     def update_chat(self,
                     chat_id: Union[str, int],
                     name: str,
@@ -250,11 +667,12 @@ class Pachca:
             }
         }
         path = f'{PATH_CHATS}/{chat_id}'
-        response = self.client.call_api(path, 'put', payload)
-        if self.cache is not None:
-            self.list_all_chats()
+        response = self.decoded(Chat, self.client.call_api(path, 'put', payload))
+        self.forget_entity(PATH_CHATS, chat_id)
+        self.patch_cached(PATH_CHATS, [response])
         return response
 
+    @timed
     def update_message(self,
                        message_id: int,
                        content: str,
@@ -267,16 +685,40 @@ class Pachca:
         if buttons:
             # set value [] to remove buttons
             message['buttons'] = buttons
-        # TODO: update files
+        if len(files) != 0:
+            # the files replace the attachments of the message
+            message['files'] = self.upload_files(files)
         payload = {'message': message}
-        self.client.call_api(f'{PATH_MESSAGES}/{message_id}', 'put', payload)
+        updated = self.client.call_api(f'{PATH_MESSAGES}/{message_id}', 'put', payload)
+        self.forget_entity(PATH_MESSAGES, message_id)
+        return self.decoded(Message, updated)
+
+    @timed
+    def upload_file(self, file: File) -> Dict:
+        # uploads the file and returns its description for a message
+        file_info = self.upload(file)
+        file.prepare(file_info['key'])
+        return file.as_dict()
+
+    @timed
+    def upload_files(self, files: List[File]) -> List[Dict]:
+        return map_ordered(self.upload_file, files, self.upload_workers)
 
+    @timed
     def upload(self, file: File) -> Optional[Dict]:
+        scope = None
+        if self.uploads_cached():
+            scope = upload_scope(file, file.digest())
+            info = self.get_uploaded(scope)
+            if info is not None:
+                # the same content has been uploaded already
+                return info
         # get pre-signed url
-        info = self.client.call_api(PATH_UPLOAD, 'post')
+        info = self.client.call_api(PATH_UPLOAD, 'post', retryable=True)
         # upload file
         url = info['direct_url']
         del info['direct_url']
-        with open(file.path, 'rb') as f:
-            self.client.upload(url, f, info)
+        body = MultipartEncoder(info, file, progress=file.progress, throughput=file.throughput)
+        self.client.upload_stream(url, body)
+        self.set_uploaded(scope, info)
         return info
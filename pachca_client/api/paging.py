@@ -0,0 +1,57 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable, Iterator, List
+
+
+def validate_window(window: int) -> None:
+    if window < 1:
+        raise ValueError('window should be greater 0')
+
+
+def iter_pages(fetch_page: Callable[[int], List], per: int, window: int = 1) -> Iterator[List]:
+    # Yields pages in order until a short page. Up to `window` pages are requested
+    # ahead concurrently, the requests beyond the last page are cancelled or dropped.
+    validate_window(window)
+    if window == 1:
+        page = 1
+        while True:
+            response = fetch_page(page)
+            yield response
+            if len(response) != per:
+                return
+            page += 1
+    executor = ThreadPoolExecutor(max_workers=window)
+    futures = deque()
+    next_page = 1
+    try:
+        while True:
+            while len(futures) < window:
+                futures.append(executor.submit(fetch_page, next_page))
+                next_page += 1
+            response = futures.popleft().result()
+            yield response
+            if len(response) != per:
+                return
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+async def aiter_pages(fetch_page: Callable[[int], Awaitable[List]], per: int, window: int = 1) -> AsyncIterator[List]:
+    import asyncio
+    validate_window(window)
+    tasks = deque()
+    next_page = 1
+    try:
+        while True:
+            while len(tasks) < window:
+                tasks.append(asyncio.ensure_future(fetch_page(next_page)))
+                next_page += 1
+            response = await tasks.popleft()
+            yield response
+            if len(response) != per:
+                return
+    finally:
+        for task in tasks:
+            task.cancel()
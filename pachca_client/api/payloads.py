@@ -0,0 +1,36 @@
+from typing import Dict, List, Union
+
+# constants and payloads shared by the clients and the send fast path, so they should not import the rest of the client
+
+CHAT_TYPE_DISCUSSION = 'discussion'
+CHAT_TYPE_THREAD = 'thread'
+CHAT_TYPE_USER = 'user'
+
+PATH_CHATS = 'chats'
+PATH_MESSAGES = 'messages'
+PATH_UPLOAD = 'uploads'
+PATH_USERS = 'users'
+
+
+def message_payload(chat_id: Union[str, int],
+                    content: str,
+                    chat_type: str = CHAT_TYPE_DISCUSSION,
+                    parent_message_id: int = None,
+                    skip_invite_mentions: bool = False,
+                    link_preview: bool = False,
+                    buttons: List[List[Dict]] = [],
+                    files: List[Dict] = []) -> Dict:
+    message = {
+        'entity_type': chat_type,
+        'content': content,
+        'entity_id': chat_id,
+        'skip_invite_mentions': skip_invite_mentions}
+    if parent_message_id is not None:
+        message['parent_message_id'] = parent_message_id
+    if len(files) != 0:
+        message['files'] = files
+    if len(buttons) != 0:
+        message['buttons'] = buttons
+    return {
+        'message': message,
+        'link_preview': link_preview}
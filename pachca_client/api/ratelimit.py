@@ -0,0 +1,80 @@
+import os
+import struct
+import threading
+import time
+from typing import Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows
+    fcntl = None
+
+# tokens and the time of the last update
+STATE_FORMAT = '<dd'
+STATE_SIZE = struct.calcsize(STATE_FORMAT)
+
+
+class TokenBucket:
+    # allows `rate` requests per second on average and up to `burst` requests at once
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        if rate <= 0:
+            raise ValueError('rate should be greater 0')
+        if burst < 1:
+            raise ValueError('burst should be greater 0')
+        self.rate = rate
+        self.burst = burst
+        self.clock = time.monotonic
+        self.lock = threading.Lock()
+        self.tokens = float(burst)
+        self.updated = self.clock()
+
+    def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def reserve(self) -> float:
+        # takes a token and returns how long to wait until it can be used
+        with self.lock:
+            self.tokens, self.updated, delay = self.take(self.tokens, self.updated, self.clock())
+        return delay
+
+    def take(self, tokens: float, updated: float, now: float) -> Tuple[float, float, float]:
+        tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate) - 1
+        # a negative balance is the queue of callers waiting for their tokens
+        if tokens >= 0:
+            return tokens, now, 0.0
+        return tokens, now, -tokens / self.rate
+
+
+class FileTokenBucket(TokenBucket):
+    # the bucket state is kept in a locked file, so all processes using the same file share the rate
+
+    def __init__(self, path: str, rate: float, burst: int = 1) -> None:
+        if fcntl is None:
+            raise RuntimeError('file locks are not supported on this platform')
+        super().__init__(rate, burst)
+        self.path = path
+        # the clock should be the same for all processes
+        self.clock = time.time
+
+    def reserve(self) -> float:
+        # flock does not exclude threads of the same process, so the thread lock is held too
+        with self.lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                data = os.pread(fd, STATE_SIZE, 0)
+                now = self.clock()
+                if len(data) == STATE_SIZE:
+                    tokens, updated = struct.unpack(STATE_FORMAT, data)
+                else:
+                    tokens, updated = float(self.burst), now
+                tokens, updated, delay = self.take(tokens, updated, now)
+                os.pwrite(fd, struct.pack(STATE_FORMAT, tokens, updated), 0)
+            finally:
+                # closing the file releases the lock
+                os.close(fd)
+        return delay
@@ -0,0 +1,64 @@
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Iterable, Optional
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ('DELETE', 'GET', 'HEAD', 'OPTIONS', 'PUT')
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    def __init__(self,
+                 attempts: int = 3,
+                 backoff: float = 0.5,
+                 max_backoff: float = 30,
+                 jitter: bool = True,
+                 statuses: Iterable[int] = RETRY_STATUSES,
+                 methods: Iterable[str] = IDEMPOTENT_METHODS) -> None:
+        if attempts < 1:
+            raise ValueError('attempts should be greater 0')
+        if backoff < 0:
+            raise ValueError('backoff should not be negative')
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(method.upper() for method in methods)
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        # the server knows better when to come back, but a thread should not sleep longer than max_backoff
+        delay = parse_retry_after(retry_after)
+        if delay is not None:
+            return min(delay, self.max_backoff)
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def should_retry(self, method: str, attempt: int, retryable: Optional[bool] = None, status_code: Optional[int] = None) -> bool:
+        # `retryable` marks a request safe (or unsafe) to repeat whatever its method is
+        if attempt >= self.attempts:
+            return False
+        if status_code is not None and status_code not in self.statuses:
+            return False
+        if retryable is not None:
+            return retryable
+        return method.upper() in self.methods
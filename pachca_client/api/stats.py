@@ -0,0 +1,189 @@
+import socket
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from pachca_client.api.cache import BaseCache
+from pachca_client.api.client import BaseClient
+
+# Types
+Labels = Tuple[Tuple[str, str], ...]
+
+# Constants
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def path_template(base_url: str, url: str) -> str:
+    # ids are replaced so paths like `messages/1` and `messages/2` share the histogram;
+    # other hosts (pre-signed uploads) are reported by the host only
+    if not url.startswith(base_url):
+        return urlsplit(url).netloc
+    path = urlsplit(url[len(base_url):]).path
+    return '/'.join('{id}' if segment.isdigit() else segment for segment in path.split('/'))
+
+
+def labels_of(**kwargs) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in kwargs.items()))
+
+
+class Histogram:
+    def __init__(self, buckets: Iterable[float]) -> None:
+        self.buckets = tuple(sorted(buckets))
+        # the last counter is for values greater than all buckets
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        # (upper bound, number of values less or equal) as Prometheus expects
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'), ), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Stats:
+    # in-process collector of client, cache and Pachca metrics,
+    # see format_prometheus and StatsdExporter to export them
+
+    def __init__(self, duration_buckets: Iterable[float] = DURATION_BUCKETS, size_buckets: Iterable[float] = SIZE_BUCKETS) -> None:
+        self.duration_buckets = tuple(duration_buckets)
+        self.size_buckets = tuple(size_buckets)
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        # name -> cache, its counters are read on snapshot
+        self.caches = {}
+
+    def increment(self, name: str, labels: Labels, value: float = 1) -> None:
+        with self.lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + value
+
+    def observe(self, name: str, labels: Labels, value: float, buckets: Iterable[float]) -> None:
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = Histogram(buckets)
+            histogram.observe(value)
+
+    def snapshot(self) -> Tuple[Dict, Dict]:
+        # (counters, histograms) keyed by (name, labels), histograms as cumulative buckets with sum and count
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: (h.cumulative(), h.sum, h.count) for key, h in self.histograms.items()}
+        for name, cache in self.caches.items():
+            for event, value in cache.counts().items():
+                counters[('cache_events_total', labels_of(cache=name, event=event))] = value
+        return counters, histograms
+
+    def watch(self, pachca) -> None:
+        # collects everything the Pachca instance, its client and its cache report
+        self.watch_pachca(pachca)
+        self.watch_client(pachca.client)
+        if pachca.cache is not None:
+            self.watch_cache(pachca.cache)
+
+    def watch_cache(self, cache: BaseCache, name: str = 'default') -> None:
+        self.caches[name] = cache
+
+    def watch_client(self, client: BaseClient) -> None:
+        def on_response(method: str, url: str, status_code: Optional[int], elapsed: float, size: int, error: Optional[Exception], **kwargs) -> None:
+            labels = labels_of(method=method, path=path_template(client.API_URL, url))
+            if error is not None:
+                self.increment('request_errors_total', labels + labels_of(error=type(error).__name__))
+                return
+            labels = labels + labels_of(status=status_code)
+            self.observe('request_duration_seconds', labels, elapsed, self.duration_buckets)
+            self.observe('response_size_bytes', labels, size, self.size_buckets)
+
+        def on_request(method: str, url: str, size: int, **kwargs) -> None:
+            labels = labels_of(method=method, path=path_template(client.API_URL, url))
+            self.observe('request_size_bytes', labels, size, self.size_buckets)
+
+        def on_retry(method: str, url: str, **kwargs) -> None:
+            self.increment('retries_total', labels_of(method=method, path=path_template(client.API_URL, url)))
+
+        client.add_hook('request', on_request)
+        client.add_hook('response', on_response)
+        client.add_hook('retry', on_retry)
+
+    def watch_pachca(self, pachca) -> None:
+        def on_call(method: str, elapsed: float, error: Optional[Exception], **kwargs) -> None:
+            labels = labels_of(method=method, outcome='success' if error is None else 'error')
+            self.observe('method_duration_seconds', labels, elapsed, self.duration_buckets)
+
+        pachca.add_hook('call', on_call)
+
+
+def escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+
+def format_prometheus(stats: Stats, prefix: str = 'pachca') -> str:
+    # the text exposition format, can be served as is from a /metrics handler
+    counters, histograms = stats.snapshot()
+    lines = []
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f'# TYPE {prefix}_{name} counter')
+        for (metric, labels), value in counters.items():
+            if metric == name:
+                lines.append(f'{prefix}_{name}{format_labels(labels)} {value}')
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f'# TYPE {prefix}_{name} histogram')
+        for (metric, labels), (buckets, total, count) in histograms.items():
+            if metric != name:
+                continue
+            for bound, value in buckets:
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f'{prefix}_{name}_bucket{format_labels(labels + (("le", le), ))} {value}')
+            lines.append(f'{prefix}_{name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{prefix}_{name}_count{format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class StatsdExporter:
+    # pushes what has changed since the previous export as StatsD counters with DogStatsD tags;
+    # call export periodically, for example from a timer thread
+
+    def __init__(self, host: str = 'localhost', port: int = 8125, prefix: str = 'pachca') -> None:
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.exported = {}
+
+    def close(self) -> None:
+        self.socket.close()
+
+    def export(self, stats: Stats) -> None:
+        for line in self.lines(stats):
+            self.socket.sendto(line.encode(), self.address)
+
+    def lines(self, stats: Stats) -> List[str]:
+        counters, histograms = stats.snapshot()
+        values = dict(counters)
+        for (name, labels), (_, total, count) in histograms.items():
+            values[(f'{name}.sum', labels)] = total
+            values[(f'{name}.count', labels)] = count
+        lines = []
+        for (name, labels), value in values.items():
+            delta = value - self.exported.get((name, labels), 0)
+            self.exported[(name, labels)] = value
+            if delta:
+                tags = ','.join(f'{key}:{tag}' for key, tag in labels)
+                lines.append(f'{self.prefix}.{name}:{delta}|c' + (f'|#{tags}' if tags else ''))
+        return lines
@@ -11,5 +11,10 @@ setup(
     license='Apache 2.0',
     keywords='pachca client',
     install_requires=['requests'],
+    extras_require={
+        'async': ['aiohttp'],
+        'json': ['orjson'],
+        'brotli': ['brotli'],
+    },
     packages=find_packages(exclude=['tests*']),
 )
@@ -0,0 +1,98 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+
+
+class StubResponse:
+    def __init__(self, status=200, body=None, headers=None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+    def encode(self):
+        if self.body is None:
+            return b''
+        if isinstance(self.body, (dict, list)):
+            return json.dumps(self.body).encode()
+        return self.body.encode()
+
+
+class StubRequest:
+    def __init__(self, method, path, params, headers, body):
+        self.method = method
+        self.path = path
+        self.params = params
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class StubServer:
+    # local HTTP server answering with queued responses or a handler function
+
+    def __init__(self, handler=None):
+        self.handler = handler
+        self.requests = []
+        self.responses = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05, ), daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}/'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add(self, status=200, body=None, headers=None):
+        self.responses.append(StubResponse(status, body, headers))
+
+    def respond(self, request):
+        with self.lock:
+            self.requests.append(request)
+            if self.handler is None:
+                return self.responses.pop(0)
+        return self.handler(request)
+
+    def make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def handle_any(self):
+                length = int(self.headers.get('Content-Length', 0))
+                url = urlparse(self.path)
+                request = StubRequest(self.command,
+                                      url.path,
+                                      dict(parse_qsl(url.query)),
+                                      dict(self.headers),
+                                      self.rfile.read(length))
+                response = stub.respond(request)
+                body = response.encode()
+                self.send_response(response.status)
+                self.send_header('Content-Type', 'application/json')
+                for name, value in response.headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = do_PUT = do_DELETE = handle_any
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,210 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from pachca_client.api.async_client import AsyncClient
+from pachca_client.api.async_pachca import AsyncPachca
+from pachca_client.api.cache import Cache
+from pachca_client.api.coalesce import AsyncSingleFlight
+from pachca_client.api.conditional import Validators
+from pachca_client.api.file import File
+import pachca_client.api.exceptions as ex
+from stub_server import StubServer, StubResponse
+
+
+class AsyncStubCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.server = StubServer().__enter__()
+        self.client = AsyncClient('secret-token')
+        self.client.API_URL = self.server.url
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    def tearDown(self):
+        self.server.__exit__()
+
+
+class TestAsyncClient(AsyncStubCase):
+
+    async def test_call_api_get(self):
+        self.server.add(200, {'data': [{'id': 1}]})
+        result = await self.client.call_api('some_method', 'get', {'arg1': 'value1', 'arg2': 2})
+        self.assertListEqual(result, [{'id': 1}])
+        request = self.server.requests[0]
+        self.assertEqual(request.path, '/some_method')
+        self.assertDictEqual(request.params, {'arg1': 'value1', 'arg2': '2'})
+        self.assertEqual(request.headers['Authorization'], 'Bearer secret-token')
+
+    async def test_coalesce(self):
+        self.client.coalesce = True
+        self.server.add(200, {'data': {'id': 1}})
+        results = await asyncio.gather(*[self.client.call_api('chats/1') for _ in range(5)])
+        self.assertListEqual(results, [{'id': 1}] * 5)
+        self.assertEqual(len(self.server.requests), 1)
+
+    async def test_coalesce_leader_cancelled(self):
+        flights = AsyncSingleFlight()
+        release = asyncio.Event()
+
+        async def call():
+            await release.wait()
+            return 1
+        leader = asyncio.ensure_future(flights.do('key', call))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.do('key', call))
+        await asyncio.sleep(0)
+        # a timeout of the first caller does not cancel the shared call
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        self.assertEqual(await follower, 1)
+        self.assertTrue(leader.cancelled())
+        self.assertDictEqual(flights.calls, {})
+
+    async def test_call_api_post(self):
+        self.server.add(201, {'data': {'id': 1}})
+        result = await self.client.call_api('some_method', 'post', {'arg1': 'value1'})
+        self.assertDictEqual(result, {'id': 1})
+        self.assertDictEqual(self.server.requests[0].json(), {'arg1': 'value1'})
+
+    async def test_empty_response(self):
+        self.server.add(204)
+        self.assertEqual(await self.client.call_api('some_method', 'delete'), '')
+
+    async def test_raised_errors(self):
+        cases = [
+            (404, {'errors': 'custom error'}, ex.PachcaClientEntryNotFound),
+            (409, {'errors': 'custom error'}, ex.PachcaAlreadyExists),
+            (401, 'plain_error_text', ex.PachcaClientBadRequestException),
+            (502, '', ex.PachcaClientUnexpectedResponseException),
+        ]
+        for status, body, exception in cases:
+            self.server.add(status, body)
+            with self.assertRaises(exception):
+                await self.client.call_api('some_method')
+
+    async def test_silent_error(self):
+        self.client.raise_on_error = False
+        self.server.add(401, {'errors': 'custom error'})
+        self.assertDictEqual(await self.client.call_api('some_method'), {'errors': 'custom error'})
+
+
+class TestAsyncConditional(AsyncStubCase):
+    async def test_not_modified(self):
+        self.client.validators = Validators()
+        self.server.add(200, {'data': [{'id': 1}]}, {'ETag': '"v1"'})
+        self.server.add(304)
+        self.assertListEqual(await self.client.call_api('chats', payload={'per': 50}), [{'id': 1}])
+        self.assertListEqual(await self.client.call_api('chats', payload={'per': 50}), [{'id': 1}])
+        self.assertEqual(self.server.requests[1].headers.get('If-None-Match'), '"v1"')
+
+
+class TestAsyncPachca(AsyncStubCase):
+    def setUp(self):
+        super().setUp()
+        self.pachca = AsyncPachca(self.client, Cache())
+
+    async def test_new_message_to_named_chat(self):
+        self.server.add(200, {'data': [{'name': 'Chat1', 'id': 100}]})
+        self.server.add(201, {'data': {'id': 200}})
+        response = await self.pachca.new_message(chat_id='Chat1', content='Message')
+        self.assertDictEqual(response, {'id': 200})
+        self.assertEqual(self.server.requests[1].json()['message']['entity_id'], 100)
+
+    async def test_list_all_chats(self):
+        self.server.add(200, {'data': [{'name': 'Chat1', 'id': 100}, {'name': 'Chat2', 'id': 200}]})
+        self.server.add(200, {'data': [{'name': 'Chat3', 'id': 300}]})
+        chats = await self.pachca.list_all_chats(per=2)
+        self.assertEqual([chat['id'] for chat in chats], [100, 200, 300])
+        self.assertEqual(await self.pachca.resolve_chat_name('Chat3'), 300)
+        self.assertEqual(len(self.server.requests), 2)
+
+    async def test_resolve_single_flight(self):
+        self.server.add(200, {'data': [{'name': 'Chat1', 'id': 100}]})
+        results = await asyncio.gather(*[self.pachca.resolve_chat_name('Chat1') for _ in range(10)])
+        self.assertListEqual(results, [100] * 10)
+        self.assertEqual(len(self.server.requests), 1)
+
+    async def test_resolve_stale_while_revalidate(self):
+        self.pachca.stale_while_revalidate = True
+        self.pachca.cache.clock = lambda: 1000.0
+        self.server.add(200, {'data': [{'name': 'Chat1', 'id': 100}]})
+        self.server.add(200, {'data': [{'name': 'Chat1', 'id': 200}]})
+        self.assertEqual(await self.pachca.resolve_chat_name('Chat1'), 100)
+        self.pachca.cache.clock = lambda: 2000.0
+        results = await asyncio.gather(*[self.pachca.resolve_chat_name('Chat1') for _ in range(10)])
+        self.assertListEqual(results, [100] * 10)
+        await asyncio.gather(*self.pachca.tasks)
+        self.assertEqual(await self.pachca.resolve_chat_name('Chat1'), 200)
+        self.assertEqual(len(self.server.requests), 2)
+
+    async def test_send_many(self):
+        self.server.add(200, {'data': [{'name': 'Chat1', 'id': 100}]})
+        self.server.add(201, {'data': {'id': 1}})
+        self.server.add(201, {'data': {'id': 2}})
+        results = await self.pachca.send_many([{'chat_id': 'Chat1', 'content': 'a'}, {'chat_id': 'Chat2', 'content': 'b'}, {'chat_id': 200, 'content': 'c'}])
+        self.assertListEqual([result.ok for result in results], [True, False, True])
+        self.assertEqual(len(self.server.requests), 3)
+
+    async def test_add_reactions(self):
+        self.server.add(201)
+        self.server.add(409, {'errors': [{'key': 'code', 'value': 'exists'}]})
+        self.server.add(400, {'errors': [{'key': 'code', 'value': 'invalid'}]})
+        results = await self.pachca.add_reactions([(1, '👍'), (2, '👍'), (3, '?')], workers=1)
+        self.assertListEqual([result.ok for result in results], [True, True, False])
+        self.assertIsInstance(results[2].error, ex.PachcaClientBadRequestException)
+
+    async def test_collect_reactions(self):
+        self.server.handler = lambda request: StubResponse(200, {'data': (
+            [{'id': 1}, {'id': 2}] if request.path == '/messages' and request.params['page'] == '1' else
+            [{'code': '👍', 'user_id': 1}] if request.path.endswith('/reactions') else [])})
+        counts = await self.pachca.collect_reactions(100, key=lambda reaction: (reaction['code'], reaction['user_id']))
+        self.assertDictEqual(dict(counts), {('👍', 1): 2})
+
+    async def test_iter_messages(self):
+        self.server.add(200, {'data': [{'id': 1}, {'id': 2}]})
+        self.server.add(200, {'data': []})
+        messages = [message['id'] async for message in self.pachca.iter_messages(100, per=2)]
+        self.assertListEqual(messages, [1, 2])
+        self.assertEqual(self.server.requests[1].params['page'], '2')
+
+    async def test_concurrent_messages(self):
+        for i in range(20):
+            self.server.add(201, {'data': {'id': i}})
+        messages = await asyncio.gather(*[self.pachca.new_message(chat_id=100, content=str(i)) for i in range(20)])
+        self.assertEqual(len(messages), 20)
+
+    async def test_upload(self):
+        self.server.add(201, {'key': 'attaches/files/1/${filename}', 'direct_url': self.server.url + 'direct', 'policy': 'p'})
+        self.server.add(204)
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(b'content')
+        try:
+            info = await self.pachca.upload(File(f.name))
+        finally:
+            os.unlink(f.name)
+        self.assertDictEqual(info, {'key': 'attaches/files/1/${filename}', 'policy': 'p'})
+        upload = self.server.requests[1]
+        self.assertEqual(upload.path, '/direct')
+        self.assertIn(b'content', upload.body)
+        self.assertIn(b'name="policy"', upload.body)
+
+    async def test_update_message_with_files(self):
+        self.server.add(201, {'key': 'attaches/files/1/${filename}', 'direct_url': self.server.url + 'direct'})
+        self.server.add(204)
+        self.server.add(200, {'data': {'id': 100, 'content': 'Updated'}})
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(b'content')
+        try:
+            response = await self.pachca.update_message(100, 'Updated', files=[File(f.name, 'report.csv')])
+        finally:
+            os.unlink(f.name)
+        self.assertDictEqual(response, {'id': 100, 'content': 'Updated'})
+        update = self.server.requests[2]
+        self.assertEqual((update.method, update.path), ('PUT', '/messages/100'))
+        self.assertEqual(update.json()['message']['files'][0]['key'], 'attaches/files/1/report.csv')
+
+
+if __name__ == '__main__':
+    unittest.main()
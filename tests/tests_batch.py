@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+import unittest
+from pachca_client.api.batch import map_ordered, map_results, amap_ordered, amap_results, imap_unordered, aimap_unordered
+
+
+class TestMapOrdered(unittest.TestCase):
+    def test_invalid_workers(self):
+        with self.assertRaises(ValueError):
+            map_ordered(str, [1], 0)
+
+    def test_order(self):
+        def func(item):
+            time.sleep(0.01 * (item % 3))
+            return item * 2
+        self.assertListEqual(map_ordered(func, list(range(10)), 4), [item * 2 for item in range(10)])
+
+    def test_bounded(self):
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def func(item):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+        map_ordered(func, list(range(12)), 3)
+        self.assertEqual(running[1], 3)
+
+    def test_error_cancels_pending(self):
+        started = []
+
+        def func(item):
+            started.append(item)
+            if item == 1:
+                raise RuntimeError('failed')
+            time.sleep(0.05)
+        with self.assertRaises(RuntimeError):
+            map_ordered(func, list(range(20)), 2)
+        self.assertLess(len(started), 20)
+
+
+class TestMapResults(unittest.TestCase):
+    def test_errors(self):
+        def func(item):
+            if item % 2:
+                raise ValueError(item)
+            return item
+        results = map_results(func, list(range(6)), 3)
+        self.assertListEqual([result.item for result in results], list(range(6)))
+        self.assertListEqual([result.ok for result in results], [True, False] * 3)
+        self.assertListEqual([result.result for result in results if result.ok], [0, 2, 4])
+        self.assertTrue(all(isinstance(result.error, ValueError) for result in results if not result.ok))
+
+
+class TestImapUnordered(unittest.TestCase):
+    def test_lazy_and_bounded(self):
+        consumed = []
+
+        def items():
+            for item in range(12):
+                consumed.append(item)
+                yield item
+
+        def func(item):
+            time.sleep(0.01)
+            # items are read only as threads become free
+            self.assertLessEqual(len(consumed), item + 3)
+            return item * 2
+        self.assertListEqual(sorted(imap_unordered(func, items(), 2)), [item * 2 for item in range(12)])
+
+    def test_error(self):
+        def func(item):
+            if item == 3:
+                raise RuntimeError('failed')
+            return item
+        with self.assertRaises(RuntimeError):
+            list(imap_unordered(func, iter(range(100)), 2))
+
+
+class TestAsyncMapOrdered(unittest.IsolatedAsyncioTestCase):
+    async def test_order(self):
+        async def func(item):
+            await asyncio.sleep(0.01 * (item % 3))
+            return item * 2
+        self.assertListEqual(await amap_ordered(func, list(range(10)), 4), [item * 2 for item in range(10)])
+
+    async def test_error_cancels_pending(self):
+        finished = []
+
+        async def func(item):
+            if item == 1:
+                raise RuntimeError('failed')
+            await asyncio.sleep(0.05)
+            finished.append(item)
+        with self.assertRaises(RuntimeError):
+            await amap_ordered(func, list(range(20)), 4)
+        await asyncio.sleep(0.1)
+        self.assertListEqual(finished, [])
+
+
+class TestAsyncMapResults(unittest.IsolatedAsyncioTestCase):
+    async def test_errors(self):
+        async def func(item):
+            if item % 2:
+                raise ValueError(item)
+            return item
+        results = await amap_results(func, list(range(6)), 3)
+        self.assertListEqual([result.ok for result in results], [True, False] * 3)
+
+
+class TestAsyncImapUnordered(unittest.IsolatedAsyncioTestCase):
+    async def test_results(self):
+        async def items():
+            for item in range(10):
+                yield item
+
+        async def func(item):
+            await asyncio.sleep(0.001 * (item % 3))
+            return item * 2
+        results = [result async for result in aimap_unordered(func, items(), 3)]
+        self.assertListEqual(sorted(results), [item * 2 for item in range(10)])
+
+
+if __name__ == '__main__':
+    unittest.main()
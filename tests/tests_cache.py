@@ -1,4 +1,6 @@
-from pachca_client.api.cache import Cache
+from pachca_client.api.cache import Cache, SqliteCache
+import os
+import tempfile
 import unittest
 from time import sleep
 
@@ -8,6 +10,14 @@ class TestCacheInit(unittest.TestCase):
         with self.assertRaises(ValueError):
             Cache(ttl=0)
 
+    def test_init_with_invalid_scope_ttl(self):
+        with self.assertRaises(ValueError):
+            Cache(scope_ttl={'users': 0})
+
+    def test_init_with_invalid_max_size(self):
+        with self.assertRaises(ValueError):
+            Cache(max_size=0)
+
     def test_init_with_valid_ttl(self):
         raised = False
         try:
@@ -17,6 +27,14 @@ class TestCacheInit(unittest.TestCase):
         self.assertFalse(raised)
 
 
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
 class TestCacheGet(unittest.TestCase):
     def test_not_exists(self):
         c = Cache()
@@ -34,3 +52,145 @@ class TestCacheGet(unittest.TestCase):
         sleep(2)
         users = c.get('users')
         self.assertIsNone(users)
+
+    def test_expired_purged(self):
+        c = Cache(ttl=2)
+        c.clock = FakeClock()
+        c.update('users', 'A')
+        c.clock.now += 3
+        self.assertIsNone(c.get('users'))
+        # kept for stale lookups until stale_ttl (the ttl by default) is over
+        self.assertEqual(len(c), 1)
+        c.clock.now += 2
+        self.assertIsNone(c.get('users'))
+        self.assertEqual(len(c), 0)
+
+    def test_scope_ttl(self):
+        c = Cache(ttl=2, scope_ttl={'users': 10})
+        c.clock = FakeClock()
+        c.update('chats', 'A')
+        c.update('users', 'B')
+        c.update('users:nickname', 'C')
+        c.clock.now += 5
+        self.assertIsNone(c.get('chats'))
+        self.assertEqual(c.get('users'), 'B')
+        self.assertEqual(c.get('users:nickname'), 'C')
+
+    def test_delete(self):
+        c = Cache()
+        c.update('users', 'A')
+        c.delete('users')
+        c.delete('chats')
+        self.assertIsNone(c.get('users'))
+
+
+class TestCacheCounters(unittest.TestCase):
+    def test_counts(self):
+        c = Cache(ttl=2)
+        c.clock = FakeClock()
+        c.get('users')
+        c.update('users', 'A')
+        c.get('users')
+        c.clock.now += 3
+        c.lookup('users')
+        c.get('users')
+        self.assertDictEqual(c.counts(), {'miss': 2, 'refresh': 1, 'hit': 1, 'stale': 1})
+
+
+class TestCacheEviction(unittest.TestCase):
+    def test_lru(self):
+        c = Cache(max_size=2)
+        c.update('a', 1)
+        c.update('b', 2)
+        c.get('a')
+        c.update('c', 3)
+        self.assertEqual(len(c), 2)
+        self.assertIsNone(c.get('b'))
+        self.assertEqual(c.get('a'), 1)
+        self.assertEqual(c.get('c'), 3)
+
+    def test_expired_evicted_on_update(self):
+        c = Cache(ttl=2)
+        c.clock = FakeClock()
+        c.update('a', 1)
+        c.clock.now += 5
+        c.update('b', 2)
+        self.assertEqual(len(c), 1)
+
+    def test_keep_expiry(self):
+        c = Cache(ttl=10)
+        c.clock = FakeClock()
+        c.update('a', 1)
+        c.clock.now += 5
+        c.update('a', 2, keep_expiry=True)
+        c.update('b', 3, keep_expiry=True)
+        c.clock.now += 6
+        self.assertEqual(c.lookup('a'), (2, True))
+        self.assertEqual(c.lookup('b'), (3, False))
+
+    def test_stale_kept_on_update(self):
+        c = Cache(ttl=2, stale_ttl=10)
+        c.clock = FakeClock()
+        c.update('a', 1)
+        c.clock.now += 3
+        c.update('b', 2)
+        self.assertIsNone(c.get('a'))
+        self.assertEqual(c.lookup('a'), (1, True))
+        c.clock.now += 10
+        c.update('b', 2)
+        self.assertEqual(c.lookup('a'), (None, True))
+
+
+class TestSqliteCache(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.path + suffix):
+                os.unlink(self.path + suffix)
+
+    def test_shared(self):
+        a = SqliteCache(self.path)
+        b = SqliteCache(self.path)
+        self.assertIsNone(b.get('users'))
+        a.update('users', [{'id': 1, 'nickname': 'andrey'}])
+        self.assertListEqual(b.get('users'), [{'id': 1, 'nickname': 'andrey'}])
+        a.update('users', [])
+        self.assertListEqual(b.get('users'), [])
+        b.delete('users')
+        self.assertIsNone(a.get('users'))
+
+    def test_keep_expiry(self):
+        a = SqliteCache(self.path, ttl=10)
+        b = SqliteCache(self.path, ttl=10)
+        a.clock = b.clock = FakeClock()
+        a.update('users', 'A')
+        self.assertEqual(b.get('users'), 'A')
+        a.clock.now += 5
+        a.update('users', 'B', keep_expiry=True)
+        # the same expiry, but the other instance sees the new value
+        self.assertEqual(b.get('users'), 'B')
+        a.clock.now += 6
+        self.assertEqual(b.lookup('users'), ('B', True))
+
+    def test_expired(self):
+        c = SqliteCache(self.path, ttl=2)
+        c.clock = FakeClock()
+        c.update('users', 'A')
+        self.assertEqual(c.get('users'), 'A')
+        c.clock.now += 3
+        self.assertIsNone(c.get('users'))
+        self.assertDictEqual(c.counts(), {'refresh': 1, 'hit': 1, 'miss': 1})
+
+    def test_stale_kept_on_update(self):
+        c = SqliteCache(self.path, ttl=2)
+        c.clock = FakeClock()
+        c.update('users', 'A')
+        c.clock.now += 3
+        c.update('chats', 'B')
+        self.assertEqual(c.lookup('users'), ('A', True))
+        c.clock.now += 3
+        c.update('chats', 'B')
+        self.assertEqual(SqliteCache(self.path).lookup('users'), (None, True))
@@ -1,7 +1,15 @@
+import json
 import unittest.mock as mock
 import unittest
 from pachca_client import Client
+from pachca_client.api.codec import JsonCodec, default_codec
 import pachca_client.api.exceptions as ex
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pachca_client.api.coalesce import SingleFlight
+from pachca_client.api.conditional import Validators, conditional_headers
+from stub_server import StubServer, StubResponse
 
 
 def mock_response(status_code, body="", exception=None):
@@ -12,6 +20,7 @@ def mock_response(status_code, body="", exception=None):
     else:
         mm.json.return_value = body
     mm.text = body
+    mm.content = (body if isinstance(body, str) else json.dumps(body)).encode()
     return mm
 
 
@@ -115,7 +124,8 @@ class TestCallApi(unittest.TestCase):
             request = args[0]
             self.assertEqual(request.url, 'https://api.pachca.com/api/shared/v1/some_method')
             self.assertEqual(request.headers['Authorization'], 'Bearer secret-token')
-            self.assertEqual(request.body, b'{"arg1": "value1", "arg2": "value2"}')
+            self.assertDictEqual(json.loads(request.body), {'arg1': 'value1', 'arg2': 'value2'})
+            self.assertEqual(request.headers['Content-Type'], 'application/json')
             return mock_response(200, '')
         mm = mock.MagicMock()
         mm.send.side_effect = mock_post
@@ -123,5 +133,172 @@ class TestCallApi(unittest.TestCase):
         client.call_api('some_method', 'post', {'arg1': 'value1', 'arg2': 'value2'})
 
 
+class TestCodec(unittest.TestCase):
+    def test_default(self):
+        with mock.patch('pachca_client.api.codec.orjson', None), mock.patch('pachca_client.api.codec.ujson', None):
+            self.assertIsInstance(default_codec(), JsonCodec)
+            self.assertEqual(Client('').codec.name, 'json')
+
+    def test_stdlib_encoding(self):
+        self.assertEqual(JsonCodec().dumps({'arg1': 'value1'}), b'{"arg1": "value1"}')
+
+    def test_custom_codec(self):
+        codec = JsonCodec()
+        codec.dumps = mock.MagicMock(return_value=b'{"encoded": true}')
+        codec.loads = mock.MagicMock(return_value={'data': {'id': 1}})
+        client = Client('', codec=codec)
+        client.session = mock.MagicMock()
+        client.session.send.return_value = mock_response(200, {'data': {'id': 1}})
+        self.assertDictEqual(client.call_api('messages', 'post', {'message': {}}), {'id': 1})
+        self.assertEqual(client.session.send.call_args.args[0].body, b'{"encoded": true}')
+
+    def test_decoded_once(self):
+        codec = JsonCodec()
+        codec.loads = mock.MagicMock(side_effect=json.loads)
+        client = Client('', codec=codec)
+        with self.assertRaises(ex.PachcaClientEntryNotFound):
+            client.handle_response(mock_response(404, {'errors': 'not found'}))
+        client.handle_response(mock_response(200, {'data': []}))
+        self.assertEqual(codec.loads.call_count, 2)
+
+    def test_invalid_error_decoded_once(self):
+        codec = JsonCodec()
+        codec.loads = mock.MagicMock(side_effect=json.loads)
+        client = Client('', codec=codec)
+        with self.assertRaises(ex.PachcaClientBadRequestException):
+            client.handle_response(mock_response(400, 'bad request'))
+        self.assertEqual(codec.loads.call_count, 1)
+
+
+class TestCoalesce(unittest.TestCase):
+    def test_concurrent_reads(self):
+        def handler(request):
+            time.sleep(0.1)
+            return StubResponse(200, {'data': {'id': 1}})
+        with StubServer(handler) as server:
+            client = Client('', coalesce=True)
+            client.API_URL = server.url
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(executor.map(lambda _: client.call_api('chats/1', payload={'a': 1, 'b': 2}), range(8)))
+            self.assertListEqual(results, [{'id': 1}] * 8)
+            self.assertEqual(len(server.requests), 1)
+            client.call_api('chats/1', payload={'a': 1, 'b': 2})
+            self.assertEqual(len(server.requests), 2)
+
+    def test_shared_error(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def call():
+            started.set()
+            release.wait(1)
+            raise ex.PachcaClientEntryNotFound('not found')
+        flights = SingleFlight()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(flights.do, 'key', call)
+            started.wait(1)
+            follower = executor.submit(flights.do, 'key', mock.MagicMock())
+            time.sleep(0.05)
+            release.set()
+            for future in (leader, follower):
+                with self.assertRaises(ex.PachcaClientEntryNotFound):
+                    future.result()
+
+    def test_writes_not_coalesced(self):
+        client = Client('', coalesce=True)
+        client.call = mock.MagicMock(return_value={'id': 1})
+        client.flights.do = mock.MagicMock()
+        client.call_api('messages', 'post', {'message': {}})
+        client.flights.do.assert_not_called()
+
+
+class TestConditional(unittest.TestCase):
+    def test_not_modified(self):
+        responses = [StubResponse(200, {'data': [{'id': 1}]}, {'ETag': '"v1"'}), StubResponse(304),
+                     StubResponse(200, {'data': [{'id': 2}]}, {'ETag': '"v2"'})]
+        with StubServer(lambda request: responses.pop(0)) as server:
+            codec = JsonCodec()
+            codec.loads = mock.MagicMock(side_effect=json.loads)
+            client = Client('', codec=codec, conditional=True)
+            client.API_URL = server.url
+            self.assertListEqual(client.call_api('chats', payload={'per': 50}), [{'id': 1}])
+            self.assertListEqual(client.call_api('chats', payload={'per': 50}), [{'id': 1}])
+            self.assertListEqual(client.call_api('chats', payload={'per': 50}), [{'id': 2}])
+        self.assertNotIn('If-None-Match', server.requests[0].headers)
+        self.assertEqual([request.headers.get('If-None-Match') for request in server.requests[1:]], ['"v1"', '"v1"'])
+        # the 304 response is not decoded
+        self.assertEqual(codec.loads.call_count, 2)
+
+    def test_per_url(self):
+        with StubServer(lambda request: StubResponse(200, {'data': []}, {'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'})) as server:
+            client = Client('', conditional=True)
+            client.API_URL = server.url
+            client.call_api('chats', payload={'page': 1})
+            client.call_api('chats', payload={'page': 2})
+            client.call_api('chats', payload={'page': 1})
+        self.assertEqual([request.headers.get('If-Modified-Since') for request in server.requests],
+                         [None, None, 'Wed, 21 Oct 2015 07:28:00 GMT'])
+
+    def test_validators_bounded(self):
+        validators = Validators(maxsize=2)
+        for key in ('a', 'b', 'c'):
+            validators.store(key, {'ETag': key}, key)
+        self.assertIsNone(validators.get('a'))
+        self.assertEqual(conditional_headers(validators.get('c')), {'If-None-Match': 'c'})
+        validators.store('c', {}, 'c')
+        self.assertIsNone(validators.get('c'))
+
+    def test_accept_encoding(self):
+        with StubServer(lambda request: StubResponse(200, {'data': []})) as server:
+            client = Client('')
+            client.API_URL = server.url
+            client.call_api('chats')
+        self.assertIn('gzip', server.requests[0].headers['Accept-Encoding'])
+        self.assertNotIn('If-None-Match', server.requests[0].headers)
+
+
+class TestPool(unittest.TestCase):
+
+    def test_invalid_pool_size(self):
+        with self.assertRaises(ValueError):
+            Client('', pool_maxsize=0)
+
+    def test_adapter(self):
+        client = Client('', pool_connections=2, pool_maxsize=32, pool_block=True)
+        adapter = client.session.get_adapter('https://api.pachca.com/')
+        self.assertEqual(adapter._pool_maxsize, 32)
+        self.assertEqual(adapter._pool_connections, 2)
+        self.assertTrue(adapter._pool_block)
+
+    def test_keep_alive(self):
+        self.assertNotIn('Connection', Client('').headers)
+        self.assertEqual(Client('', keep_alive=False).headers['Connection'], 'close')
+
+    def test_cookies_not_stored(self):
+        with StubServer() as server:
+            server.add(200, {'data': []}, headers={'Set-Cookie': 'session=1; Path=/'})
+            client = Client('')
+            client.API_URL = server.url
+            client.call_api('chats')
+        self.assertEqual(len(client.session.cookies), 0)
+
+    def test_close_idle(self):
+        client = Client('', idle_timeout=10)
+        client.close = mock.MagicMock()
+        client.close_idle()
+        client.close.assert_not_called()
+        client.last_used -= 20
+        client.close_idle()
+        client.close.assert_called_once()
+
+    def test_shared_by_threads(self):
+        with StubServer(lambda request: StubResponse(200, {'data': {'id': request.params['id']}})) as server:
+            client = Client('', pool_maxsize=8)
+            client.API_URL = server.url
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(executor.map(lambda i: client.call_api('chats', payload={'id': i}), range(100)))
+        self.assertListEqual([int(result['id']) for result in results], list(range(100)))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,77 @@
+import threading
+import unittest
+from pachca_client import Checkpoints, HistorySync
+
+
+class FakePachca:
+    # chats with messages listed from the newest as the API does
+    def __init__(self, chats):
+        self.chats = chats
+        self.lock = threading.Lock()
+        self.pages = []
+        self.listed_after = []
+
+    def add(self, chat_id, message_id):
+        self.chats[chat_id].append({'id': message_id, 'created_at': f'2024-01-01T00:00:{message_id:02}.000Z'})
+
+    def iter_chats(self, per, last_message_at_after=None):
+        self.listed_after.append(last_message_at_after)
+        for chat_id, messages in self.chats.items():
+            last_message_at = messages[-1]['created_at'] if messages else None
+            if last_message_at_after is None or (last_message_at and last_message_at > last_message_at_after):
+                yield {'id': chat_id, 'last_message_at': last_message_at}
+
+    def list_messages(self, chat_id, per, page):
+        with self.lock:
+            self.pages.append((chat_id, page))
+        messages = self.chats[chat_id][::-1]
+        return messages[(page - 1) * per:page * per]
+
+
+class TestHistorySync(unittest.TestCase):
+    def setUp(self):
+        self.pachca = FakePachca({1: [], 2: []})
+        for message_id in range(1, 11):
+            self.pachca.add(1, message_id)
+        for message_id in range(11, 14):
+            self.pachca.add(2, message_id)
+        self.checkpoints = Checkpoints(':memory:')
+        self.sync = HistorySync(self.pachca, self.checkpoints, workers=2, per=3)
+        self.handled = {}
+        self.lock = threading.Lock()
+
+    def handle(self, chat_id, messages):
+        with self.lock:
+            self.handled.setdefault(chat_id, []).extend(message['id'] for message in messages)
+
+    def test_incremental(self):
+        results = self.sync.run(self.handle)
+        self.assertEqual({result.item: result.result for result in results}, {1: 10, 2: 3})
+        self.assertEqual(sorted(self.handled[1]), list(range(1, 11)))
+        self.assertEqual(self.checkpoints.get(1), (10, '2024-01-01T00:00:10.000Z'))
+
+        self.pachca.pages.clear()
+        self.handled.clear()
+        self.pachca.add(1, 14)
+        results = self.sync.run(self.handle)
+        # only the changed chat is listed and paging stops at the synced messages
+        self.assertEqual(self.pachca.listed_after[-1], '2024-01-01T00:00:13.000Z')
+        self.assertEqual([(result.item, result.result) for result in results], [(1, 1)])
+        self.assertEqual(self.handled, {1: [14]})
+        self.assertEqual(self.pachca.pages, [(1, 1)])
+
+    def test_failed_chat(self):
+        def handle(chat_id, messages):
+            if chat_id == 2:
+                raise RuntimeError('storage is not available')
+            self.handle(chat_id, messages)
+        results = self.sync.run(handle)
+        self.assertFalse([result for result in results if result.item == 2][0].ok)
+        self.assertIsNone(self.checkpoints.get(2))
+        self.assertIsNone(self.checkpoints.get_cursor())
+        self.sync.run(self.handle)
+        self.assertEqual(sorted(self.handled[2]), [11, 12, 13])
+
+
+if __name__ == '__main__':
+    unittest.main()
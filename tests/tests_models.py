@@ -0,0 +1,38 @@
+import pickle
+import unittest
+from pachca_client import Chat, User
+
+
+class TestModel(unittest.TestCase):
+    def test_lazy_fields(self):
+        raw = {'id': 1, 'name': 'Chat1', 'owner_id': 10, 'custom': True}
+        chat = Chat(raw)
+        self.assertEqual(chat.loaded(), ())
+        self.assertEqual(chat.name, 'Chat1')
+        self.assertEqual(chat.loaded(), ('name', ))
+        self.assertIsNone(chat.public)
+        self.assertTrue(chat['custom'])
+        self.assertIs(chat.as_dict(), raw)
+        self.assertEqual(chat, raw)
+
+    def test_project(self):
+        user = User({'id': 1, 'nickname': 'andrey', 'email': 'andrey@example.com'}).project()
+        self.assertIsNone(user.raw)
+        self.assertIsNone(user.email)
+        self.assertDictEqual(user.as_dict(), {'id': 1, 'nickname': 'andrey'})
+        self.assertEqual(user.get('email', 'unknown'), 'unknown')
+        with self.assertRaises(KeyError):
+            user['custom']
+        with self.assertRaises(AttributeError):
+            user.custom
+
+    def test_pickle(self):
+        chat = pickle.loads(pickle.dumps(Chat.projected({'id': 1, 'name': 'Chat1', 'public': True})))
+        self.assertEqual(chat.loaded(), ('id', 'name'))
+        self.assertEqual(chat, Chat(None, id=1, name='Chat1'))
+        chat = pickle.loads(pickle.dumps(Chat({'id': 1, 'name': 'Chat1'})))
+        self.assertDictEqual(chat.raw, {'id': 1, 'name': 'Chat1'})
+
+
+if __name__ == '__main__':
+    unittest.main()
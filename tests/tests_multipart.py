@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+from email.parser import BytesParser
+from email.policy import HTTP
+from pachca_client import Client, File
+from pachca_client.api.multipart import MultipartEncoder
+from stub_server import StubServer
+
+
+def parse(content_type, body):
+    message = BytesParser(policy=HTTP).parsebytes(f'Content-Type: {content_type}\r\n\r\n'.encode() + body)
+    return {part.get_param('name', header='content-disposition'): part for part in message.iter_parts()}
+
+
+class TestMultipartEncoder(unittest.TestCase):
+    def setUp(self):
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(os.urandom(100000))
+        self.path = f.name
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_invalid_chunk_size(self):
+        with self.assertRaises(ValueError):
+            MultipartEncoder({}, File(self.path), chunk_size=0)
+
+    def test_body(self):
+        encoder = MultipartEncoder({'key': 'attaches/${filename}', 'policy': 'p'}, File(self.path, name='report "1".txt'))
+        body = b''.join(encoder)
+        self.assertEqual(len(body), len(encoder))
+        parts = parse(encoder.content_type, body)
+        self.assertEqual(parts['key'].get_content(), 'attaches/${filename}')
+        self.assertEqual(parts['policy'].get_content(), 'p')
+        with open(self.path, 'rb') as f:
+            self.assertEqual(parts['file'].get_content(), f.read())
+        self.assertEqual(parts['file'].get_filename(), 'report %221%22.txt')
+
+    def test_chunks(self):
+        encoder = MultipartEncoder({}, File(self.path), chunk_size=4096)
+        chunks = list(encoder)
+        self.assertTrue(all(len(chunk) <= 4096 for chunk in chunks[1:-1]))
+        # the body can be read again
+        self.assertEqual(b''.join(encoder), b''.join(chunks))
+
+    def test_callbacks(self):
+        progress = []
+        throughput = []
+        encoder = MultipartEncoder({}, File(self.path), chunk_size=30000,
+                                   progress=lambda sent, total: progress.append((sent, total)),
+                                   throughput=throughput.append)
+        list(encoder)
+        self.assertListEqual(progress, [(30000, 100000), (60000, 100000), (90000, 100000), (100000, 100000)])
+        self.assertTrue(all(rate > 0 for rate in throughput))
+
+
+class TestUploadStream(unittest.TestCase):
+    def test_upload_stream(self):
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(b'content' * 10000)
+        try:
+            with StubServer() as server:
+                server.add(204)
+                encoder = MultipartEncoder({'policy': 'p'}, File(f.name))
+                Client('').upload_stream(server.url + 'direct', encoder)
+        finally:
+            os.unlink(f.name)
+        request = server.requests[0]
+        self.assertEqual(int(request.headers['Content-Length']), len(encoder))
+        self.assertNotIn('Transfer-Encoding', request.headers)
+        parts = parse(request.headers['Content-Type'], request.body)
+        self.assertEqual(parts['file'].get_content(), b'content' * 10000)
+
+
+if __name__ == '__main__':
+    unittest.main()
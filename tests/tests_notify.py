@@ -0,0 +1,51 @@
+import subprocess
+import sys
+import unittest
+import unittest.mock as mock
+import pachca_client
+import pachca_client.api.exceptions as ex
+from pachca_client import send
+from pachca_client.api.client import BaseClient
+from stub_server import StubServer, StubResponse
+
+
+class TestLazyImport(unittest.TestCase):
+    def run_python(self, code):
+        return subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout.split()
+
+    def test_requests_deferred(self):
+        loaded = self.run_python(
+            'import sys, pachca_client\n'
+            'print("requests" in sys.modules, "asyncio" in sys.modules)\n'
+            'pachca_client.Client("")\n'
+            'print("requests" in sys.modules)\n'
+        )
+        self.assertEqual(loaded, ['False', 'False', 'True'])
+
+    def test_exports(self):
+        self.assertIn('Pachca', dir(pachca_client))
+        self.assertIs(pachca_client.send, send)
+        with self.assertRaises(AttributeError):
+            pachca_client.NotExported
+
+
+class TestSend(unittest.TestCase):
+    def test_send(self):
+        with StubServer(lambda request: StubResponse(200, {'data': {'id': 1, 'content': 'hello'}})) as server:
+            with mock.patch.object(BaseClient, 'API_URL', server.url):
+                message = send('secret-token', 10, 'hello')
+        self.assertDictEqual(message, {'id': 1, 'content': 'hello'})
+        request = server.requests[0]
+        self.assertEqual((request.method, request.path), ('POST', '/messages'))
+        self.assertEqual(request.headers['Authorization'], 'Bearer secret-token')
+        self.assertEqual(request.json()['message']['entity_id'], 10)
+
+    def test_error(self):
+        with StubServer(lambda request: StubResponse(404, {'errors': []})) as server:
+            with mock.patch.object(BaseClient, 'API_URL', server.url):
+                with self.assertRaises(ex.PachcaClientEntryNotFound):
+                    send('', 10, 'hello')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import random
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock as mock
+from pachca_client import Client, File, Outbox, Pachca
+from pachca_client.api.retry import RetryPolicy
+import pachca_client.api.exceptions as ex
+
+
+def remove_database(path):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.unlink(path + suffix)
+
+
+class TestOutbox(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.outbox = Outbox(self.path, workers=4, retry=RetryPolicy(attempts=3, backoff=0, jitter=False),
+                             poll_interval=0.01)
+
+    def tearDown(self):
+        self.outbox.stop()
+        remove_database(self.path)
+
+    def test_order_per_chat(self):
+        sent = []
+        lock = threading.Lock()
+        active = set()
+
+        def send(message):
+            with lock:
+                # a chat never has two messages in flight
+                self.assertNotIn(message['chat'], active)
+                active.add(message['chat'])
+            time.sleep(random.uniform(0, 0.005))
+            with lock:
+                active.discard(message['chat'])
+                sent.append((message['chat'], message['n']))
+        for n in range(20):
+            for chat in ('a', 'b', 'c'):
+                self.outbox.put(chat, {'chat': chat, 'n': n})
+        self.outbox.start(send)
+        self.assertTrue(self.outbox.flush(5))
+        self.assertEqual(len(sent), 60)
+        for chat in ('a', 'b', 'c'):
+            self.assertEqual([n for c, n in sent if c == chat], list(range(20)))
+
+    def test_retry_transient(self):
+        send = mock.MagicMock(side_effect=[ex.PachcaClientUnexpectedResponseException('502'), ConnectionError(), None])
+        self.outbox.put('a', {'n': 1})
+        self.outbox.start(send)
+        self.assertTrue(self.outbox.flush(5))
+        self.assertEqual(send.call_count, 3)
+        self.assertEqual(self.outbox.failed(), [])
+
+    def test_failed(self):
+        send = mock.MagicMock(side_effect=[ex.PachcaClientBadRequestException('bad'), None])
+        self.outbox.put('a', {'n': 1})
+        self.outbox.put('a', {'n': 2})
+        self.outbox.start(send)
+        self.assertTrue(self.outbox.flush(5))
+        # a message which can not be sent does not block the next ones
+        self.assertEqual(send.call_count, 2)
+        (message_id, message, error), = self.outbox.failed()
+        self.assertEqual((message, error), ({'n': 1}, 'bad'))
+        send.side_effect = None
+        self.outbox.requeue(message_id)
+        self.assertTrue(self.outbox.flush(5))
+        self.assertEqual(self.outbox.failed(), [])
+
+    def test_restart(self):
+        self.outbox.put('a', {'n': 1})
+        self.outbox.put('a', {'n': 2})
+        self.assertEqual(self.outbox.pending(), 2)
+        outbox = Outbox(self.path, poll_interval=0.01)
+        send = mock.MagicMock()
+        outbox.start(send)
+        self.assertTrue(outbox.flush(5))
+        outbox.stop()
+        self.assertEqual([call.args[0]['n'] for call in send.call_args_list], [1, 2])
+
+
+class TestEnqueueMessage(unittest.TestCase):
+    def test_enqueue(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        outbox = Outbox(path, poll_interval=0.01)
+        client = Client('')
+        client.call_api = mock.MagicMock(return_value={'id': 1})
+        pachca = Pachca(client, outbox=outbox)
+        pachca.enqueue_message(10, 'hello')
+        self.assertTrue(outbox.flush(5))
+        outbox.stop()
+        remove_database(path)
+        payload = client.call_api.call_args.kwargs['payload']
+        self.assertEqual((payload['message']['entity_id'], payload['message']['content']), (10, 'hello'))
+
+    def test_enqueue_file(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        outbox = Outbox(path, poll_interval=0.01)
+        client = Client('')
+        client.call_api = mock.MagicMock(return_value={'id': 1})
+        pachca = Pachca(client, outbox=outbox)
+        pachca.upload = mock.MagicMock(return_value={'key': 'attaches/1/${filename}'})
+        with tempfile.NamedTemporaryFile(suffix='.csv') as report:
+            # a callback can not be pickled, the file is stored without it
+            pachca.enqueue_message(10, 'report', files=[File(report.name, 'report.csv', 'image',
+                                                             progress=lambda sent, total: None)])
+            self.assertTrue(outbox.flush(5))
+        outbox.stop()
+        remove_database(path)
+        file = pachca.upload.call_args.args[0]
+        self.assertEqual((file.path, file.name, file.type, file.progress), (report.name, 'report.csv', 'image', None))
+        payload = client.call_api.call_args.kwargs['payload']
+        self.assertEqual(payload['message']['files'][0]['key'], 'attaches/1/report.csv')
+
+    def test_without_outbox(self):
+        with self.assertRaises(ValueError):
+            Pachca(Client('')).enqueue_message(10, 'hello')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,11 @@
+import os
+import tempfile
 import unittest.mock as mock
 import unittest
-from pachca_client import get_pachca, Pachca, Client, Cache
+import threading
+import time
+from pachca_client import get_pachca, Pachca, Client, Cache, Chat, File, User
+import pachca_client.api.exceptions as ex
 
 
 class TestResolveName(unittest.TestCase):
@@ -18,12 +23,13 @@ class TestResolveName(unittest.TestCase):
         self.assertEqual(self.pachca.resolve_user_name('dmitriy'), None)
 
     def test_resolve_user_name_cached(self):
-        self.pachca.get_cached = mock.MagicMock()
-        self.pachca.get_cached.return_value = [
+        self.pachca.set_cached('users', [
             {'nickname': 'andrey', 'id': 100}, {'nickname': 'sergey', 'id': 200}
-        ]
+        ])
+        self.pachca.list_all_users = mock.MagicMock()
         self.assertEqual(self.pachca.resolve_user_name('andrey'), 100)
         self.assertEqual(self.pachca.resolve_user_name('dmitriy'), None)
+        self.pachca.list_all_users.assert_not_called()
 
     def test_resolve_chat_name(self):
         self.pachca.get_cached = mock.MagicMock()
@@ -36,12 +42,91 @@ class TestResolveName(unittest.TestCase):
         self.assertEqual(self.pachca.resolve_chat_name('Chat3'), None)
 
     def test_resolve_chat_name_cached(self):
-        self.pachca.get_cached = mock.MagicMock()
-        self.pachca.get_cached.return_value = [
+        self.pachca.set_cached('chats', [
             {'name': 'Chat1', 'id': 100}, {'name': 'Chat2', 'id': 200}
-        ]
+        ])
+        self.pachca.list_all_chats = mock.MagicMock()
         self.assertEqual(self.pachca.resolve_chat_name('Chat1'), 100)
         self.assertEqual(self.pachca.resolve_chat_name('Chat3'), None)
+        self.pachca.list_all_chats.assert_not_called()
+
+    def test_resolve_chat_name_duplicated(self):
+        self.pachca.set_cached('chats', [
+            {'name': 'Chat1', 'id': 100}, {'name': 'Chat1', 'id': 200}
+        ])
+        self.assertEqual(self.pachca.resolve_chat_name('Chat1'), 100)
+
+    def test_resolve_chat_name_no_cache(self):
+        pachca = Pachca(Client(''), None)
+        pachca.list_all_chats = mock.MagicMock()
+        pachca.list_all_chats.return_value = [{'name': 'Chat1', 'id': 100}]
+        self.assertEqual(pachca.resolve_chat_name('Chat1'), 100)
+        self.assertEqual(pachca.resolve_chat_name('Chat1'), 100)
+        self.assertEqual(pachca.list_all_chats.call_count, 2)
+
+
+class TestRefresh(unittest.TestCase):
+    def setUp(self):
+        self.pachca = get_pachca('')
+        self.pachca.cache.clock = mock.MagicMock(return_value=1000.0)
+        self.calls = 0
+
+        def list_chats(per, page):
+            self.calls += 1
+            time.sleep(0.05)
+            return [{'name': 'Chat1', 'id': 100 + self.calls}]
+        self.pachca.list_chats = mock.MagicMock(side_effect=list_chats)
+
+    def resolve_concurrently(self, count=10):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.pachca.resolve_chat_name('Chat1'))) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_single_flight(self):
+        self.assertListEqual(self.resolve_concurrently(), [101] * 10)
+        self.assertEqual(self.calls, 1)
+
+    def test_expired_single_flight(self):
+        self.pachca.resolve_chat_name('Chat1')
+        self.pachca.cache.clock.return_value += 120
+        self.assertListEqual(self.resolve_concurrently(), [102] * 10)
+        self.assertEqual(self.calls, 2)
+
+    def test_stale_while_revalidate(self):
+        self.pachca.stale_while_revalidate = True
+        self.pachca.resolve_chat_name('Chat1')
+        self.pachca.cache.clock.return_value += 120
+        # the expired index is served while it is refreshed once in the background
+        self.assertListEqual(self.resolve_concurrently(), [101] * 10)
+        self.pachca.locks['chats'].acquire()
+        self.pachca.locks['chats'].release()
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.pachca.resolve_chat_name('Chat1'), 102)
+
+    def test_stale_while_revalidate_after_update(self):
+        self.pachca.stale_while_revalidate = True
+        self.pachca.resolve_chat_name('Chat1')
+        self.pachca.cache.clock.return_value += 70
+        # an unrelated update purges expired entries, the stale index should survive it
+        self.pachca.set_cached('users', [{'nickname': 'andrey', 'id': 1}])
+        self.assertEqual(self.pachca.resolve_chat_name('Chat1'), 101)
+        self.pachca.locks['chats'].acquire()
+        self.pachca.locks['chats'].release()
+        self.assertEqual(self.calls, 2)
+
+    def test_stale_while_revalidate_failed(self):
+        self.pachca.stale_while_revalidate = True
+        self.pachca.resolve_chat_name('Chat1')
+        self.pachca.cache.clock.return_value += 120
+        self.pachca.list_chats.side_effect = RuntimeError('failed')
+        self.assertEqual(self.pachca.resolve_chat_name('Chat1'), 101)
+        self.pachca.locks['chats'].acquire()
+        self.pachca.locks['chats'].release()
+        self.assertEqual(self.pachca.resolve_chat_name('Chat1'), 101)
 
 
 class TestCached(unittest.TestCase):
@@ -56,6 +141,11 @@ class TestCached(unittest.TestCase):
         self.assertEqual(pachca.set_cached('scope1', 'value1'), 'value1')
         pachca.cache.update.assert_called_once_with('scope1', 'value1')
 
+    def test_set_cached_builds_index(self):
+        pachca = Pachca(Client(''), Cache())
+        pachca.set_cached('chats', [{'name': 'Chat1', 'id': 100}, {'name': 'Chat2', 'id': 200}])
+        self.assertDictEqual(pachca.get_cached('chats:name'), {'Chat1': 100, 'Chat2': 200})
+
 
 class TestChats(unittest.TestCase):
     def setUp(self):
@@ -88,6 +178,128 @@ class TestChats(unittest.TestCase):
         chats = self.pachca.list_all_chats(per=2)
         self.assertListEqual(chats, [{'name': 'Chat1', 'id': 100}, {'name': 'Chat2', 'id': 200}, {'name': 'Chat3', 'id': 300}])
 
+    def test_list_all_chats_window(self):
+        self.pachca.page_window = 3
+        self.pachca.list_chats = mock.MagicMock()
+        self.pachca.list_chats.side_effect = lambda per, page: [{'name': f'Chat{page}', 'id': page}] if page <= 5 else []
+        chats = self.pachca.list_all_chats(per=1)
+        self.assertListEqual([chat['id'] for chat in chats], [1, 2, 3, 4, 5])
+        self.assertEqual(self.pachca.resolve_chat_name('Chat5'), 5)
+
+
+class TestPatchCached(unittest.TestCase):
+    def setUp(self):
+        self.pachca = get_pachca('')
+        self.pachca.set_cached('chats', [{'name': 'Chat1', 'id': 100}, {'name': 'Chat2', 'id': 200}])
+        self.pachca.list_all_chats = mock.MagicMock()
+
+    def test_new_chat(self):
+        self.pachca.client.call_api = mock.MagicMock(return_value={'name': 'Chat3', 'id': 300})
+        self.pachca.new_chat('Chat3', [1])
+        self.assertEqual(self.pachca.resolve_chat_name('Chat3'), 300)
+        self.assertEqual(len(self.pachca.get_cached('chats')), 3)
+        self.pachca.list_all_chats.assert_not_called()
+
+    def test_update_chat(self):
+        self.pachca.client.call_api = mock.MagicMock(return_value={'name': 'Chat4', 'id': 200})
+        self.pachca.update_chat(200, 'Chat4')
+        self.assertIsNone(self.pachca.resolve_chat_name('Chat2'))
+        self.assertEqual(self.pachca.resolve_chat_name('Chat4'), 200)
+        self.assertListEqual(self.pachca.get_cached('chats'), [{'name': 'Chat1', 'id': 100}, {'name': 'Chat4', 'id': 200}])
+        self.pachca.list_all_chats.assert_not_called()
+
+    def test_keeps_expiry(self):
+        pachca = get_pachca('')
+        pachca.cache.clock = mock.MagicMock(return_value=1000.0)
+        pachca.set_cached('chats', [{'name': 'Chat1', 'id': 100}])
+        pachca.client.call_api = mock.MagicMock(side_effect=lambda *args, **kwargs: {'name': 'Chat2', 'id': 200})
+        # writes keep patching the list, it still expires 60 seconds after it was loaded
+        for now in (1020.0, 1040.0, 1059.0):
+            pachca.cache.clock.return_value = now
+            pachca.new_chat('Chat2', [1])
+            self.assertEqual(pachca.get_cached('chats:name'), {'Chat1': 100, 'Chat2': 200})
+        pachca.cache.clock.return_value = 1061.0
+        self.assertIsNone(pachca.get_cached('chats'))
+        self.assertIsNone(pachca.get_cached('chats:name'))
+
+    def test_not_cached(self):
+        pachca = get_pachca('')
+        pachca.client.call_api = mock.MagicMock(return_value={'name': 'Chat3', 'id': 300})
+        pachca.new_chat('Chat3', [1])
+        self.assertIsNone(pachca.get_cached('chats'))
+
+    def test_unexpected_response(self):
+        self.pachca.client.call_api = mock.MagicMock(return_value='')
+        self.pachca.new_chat('Chat3', [1])
+        self.assertEqual(len(self.pachca.get_cached('chats')), 2)
+
+    def test_refresh_chats(self):
+        self.pachca.list_chats = mock.MagicMock(return_value=[{'name': 'Chat1', 'id': 100}, {'name': 'Chat5', 'id': 500}])
+        self.pachca.refresh_chats('2024-01-01T00:00:00.000Z')
+        self.pachca.list_chats.assert_called_once_with(50, 1, 'is_member', '2024-01-01T00:00:00.000Z', None)
+        self.assertEqual(self.pachca.resolve_chat_name('Chat5'), 500)
+        self.assertEqual(len(self.pachca.get_cached('chats')), 3)
+
+
+class TestModels(unittest.TestCase):
+    def test_projected_cache(self):
+        pachca = get_pachca('')
+        pachca.set_cached('users', [{'id': 100, 'nickname': 'andrey', 'email': 'andrey@example.com'}])
+        user = pachca.get_cached('users')[0]
+        self.assertIsInstance(user, User)
+        self.assertIsNone(user.raw)
+        self.assertEqual(user.loaded(), ('id', 'nickname'))
+        self.assertEqual(pachca.resolve_user_name('andrey'), 100)
+
+    def test_cache_raw(self):
+        pachca = Pachca(Client(''), Cache(), cache_raw=True)
+        users = [{'id': 100, 'nickname': 'andrey', 'email': 'andrey@example.com'}]
+        pachca.set_cached('users', users)
+        self.assertListEqual(pachca.get_cached('users'), users)
+
+    def test_models(self):
+        pachca = Pachca(Client(''), Cache(), models=True)
+        pachca.client.call_api = mock.MagicMock(return_value=[{'id': 100, 'name': 'Chat1'}])
+        chats = pachca.list_all_chats()
+        self.assertIsInstance(chats[0], Chat)
+        self.assertEqual(chats[0].name, 'Chat1')
+        self.assertEqual(pachca.resolve_chat_name('Chat1'), 100)
+        pachca.client.call_api = mock.MagicMock(return_value={'id': 200, 'name': 'Chat2'})
+        chat = pachca.new_chat('Chat2', [1])
+        self.assertEqual(chat.id, 200)
+        self.assertEqual(pachca.resolve_chat_name('Chat2'), 200)
+
+
+class TestEntityCache(unittest.TestCase):
+    def setUp(self):
+        self.pachca = Pachca(Client(''), Cache(), entity_ttl=5)
+        self.pachca.client.call_api = mock.MagicMock(return_value={'id': 100, 'content': 'Message'})
+
+    def test_get_message(self):
+        self.assertDictEqual(self.pachca.get_message(100), {'id': 100, 'content': 'Message'})
+        self.pachca.get_message(100)['content'] = 'Changed'
+        self.assertDictEqual(self.pachca.get_message(100), {'id': 100, 'content': 'Message'})
+        self.assertEqual(self.pachca.client.call_api.call_count, 1)
+
+    def test_invalidated(self):
+        self.pachca.get_message(100)
+        self.pachca.update_message(100, 'Updated')
+        self.pachca.get_message(100)
+        self.pachca.delete_message(100)
+        self.pachca.get_message(100)
+        self.pachca.get_chat(200)
+        self.pachca.update_chat(200, 'Chat')
+        self.pachca.get_chat(200)
+        gets = [call for call in self.pachca.client.call_api.call_args_list if len(call.args) == 1 and not call.kwargs]
+        self.assertListEqual([call.args[0] for call in gets], ['messages/100'] * 3 + ['chats/200'] * 2)
+
+    def test_disabled(self):
+        pachca = Pachca(Client(''), Cache())
+        pachca.client.call_api = mock.MagicMock(return_value={'id': 100})
+        pachca.get_message(100)
+        pachca.get_message(100)
+        self.assertEqual(pachca.client.call_api.call_count, 2)
+
 
 class TestMessages(unittest.TestCase):
     def setUp(self):
@@ -102,10 +314,228 @@ class TestMessages(unittest.TestCase):
         self.pachca.client.call_api.assert_called_once()
 
 
+class TestIterators(unittest.TestCase):
+    def setUp(self):
+        self.pachca = get_pachca('')
+
+    def test_iter_messages_lazy(self):
+        pages = [[{'id': 1}, {'id': 2}], [{'id': 3}, {'id': 4}], [{'id': 5}]]
+        self.pachca.list_messages = mock.MagicMock()
+        self.pachca.list_messages.side_effect = lambda chat_id, per, page: pages[page - 1]
+        messages = self.pachca.iter_messages(100, per=2)
+        self.assertEqual(next(messages), {'id': 1})
+        self.pachca.list_messages.assert_called_once_with(100, per=2, page=1)
+        self.assertListEqual([m['id'] for m in messages], [2, 3, 4, 5])
+        self.assertEqual(self.pachca.list_messages.call_count, 3)
+
+    def test_iter_messages_prefetch(self):
+        pages = [[{'id': 1}, {'id': 2}], [{'id': 3}]]
+        self.pachca.list_messages = mock.MagicMock()
+        self.pachca.list_messages.side_effect = lambda chat_id, per, page: pages[page - 1] if page <= 2 else []
+        self.assertListEqual([m['id'] for m in self.pachca.iter_messages(100, per=2, prefetch=True)], [1, 2, 3])
+
+    def test_iter_reactions_silent_error(self):
+        self.pachca.list_reactions = mock.MagicMock(return_value=None)
+        self.assertListEqual(list(self.pachca.iter_reactions(100)), [])
+
+    def test_iter_chats_filters(self):
+        self.pachca.list_chats = mock.MagicMock(return_value=[{'id': 1}])
+        self.assertListEqual(list(self.pachca.iter_chats(last_message_at_after='2024-01-01T00:00:00.000Z')), [{'id': 1}])
+        self.pachca.list_chats.assert_called_once_with(50, 1, 'is_member', '2024-01-01T00:00:00.000Z', None)
+
+    def test_iter_users_invalid_per(self):
+        with self.assertRaises(ValueError):
+            self.pachca.iter_users(per=100)
+
+
+class TestSendMany(unittest.TestCase):
+    def setUp(self):
+        self.pachca = get_pachca('')
+        self.pachca.list_all_chats = mock.MagicMock(side_effect=lambda: self.pachca.set_cached('chats', [{'name': 'Chat1', 'id': 100}]))
+        self.pachca.list_all_users = mock.MagicMock(side_effect=lambda: self.pachca.set_cached('users', [{'nickname': 'andrey', 'id': 200}]))
+
+        def call_api(path, method, payload):
+            if payload['message']['content'] == 'fail':
+                raise ex.PachcaClientBadRequestException('failed')
+            return {'id': payload['message']['entity_id']}
+        self.pachca.client.call_api = mock.MagicMock(side_effect=call_api)
+
+    def test_send_many(self):
+        results = self.pachca.send_many([
+            {'chat_id': 'Chat1', 'content': 'a'},
+            {'chat_id': 'andrey', 'chat_type': 'user', 'content': 'b'},
+            {'chat_id': 300, 'content': 'c', 'buttons': [[{'text': 'Yes', 'data': 'yes'}]]},
+            {'chat_id': 'Chat2', 'content': 'd'},
+            {'chat_id': 400, 'content': 'fail'},
+            {'chat_id': 500},
+        ])
+        self.assertListEqual([result.ok for result in results], [True, True, True, False, False, False])
+        self.assertListEqual([result.result for result in results[:3]], [{'id': 100}, {'id': 200}, {'id': 300}])
+        self.assertIsInstance(results[3].error, ex.PachcaClientNotResolved)
+        self.assertIsInstance(results[4].error, ex.PachcaClientBadRequestException)
+        self.assertIsInstance(results[5].error, TypeError)
+        self.pachca.list_all_chats.assert_called_once()
+        self.pachca.list_all_users.assert_called_once()
+        self.assertEqual(self.pachca.client.call_api.call_count, 4)
+
+    def test_send_many_shared_files(self):
+        self.pachca.upload = mock.MagicMock(return_value={'key': 'attaches/1/${filename}'})
+        report = File('/tmp/report.txt')
+        with mock.patch.object(File, 'get_size', return_value=10):
+            results = self.pachca.send_many([{'chat_id': chat_id, 'content': 'a', 'files': [report]} for chat_id in range(10)])
+        self.assertTrue(all(result.ok for result in results))
+        self.pachca.upload.assert_called_once_with(report)
+        payload = self.pachca.client.call_api.call_args.kwargs['payload']
+        self.assertListEqual(payload['message']['files'], [{'key': 'attaches/1/report.txt', 'name': 'report.txt', 'file_type': 'file', 'size': 10}])
+
+    def test_send_many_failed_upload(self):
+        self.pachca.upload = mock.MagicMock(side_effect=ex.PachcaClientUnexpectedResponseException('failed'))
+        results = self.pachca.send_many([{'chat_id': 100, 'content': 'a', 'files': [File('/tmp/report.txt')]}, {'chat_id': 200, 'content': 'b'}])
+        self.assertIsInstance(results[0].error, ex.PachcaClientUnexpectedResponseException)
+        self.assertTrue(results[1].ok)
+
+    def test_send_many_failed_resolve(self):
+        self.pachca.list_all_chats.side_effect = ex.PachcaClientUnexpectedResponseException('failed')
+        results = self.pachca.send_many([{'chat_id': 'Chat1', 'content': 'a'}, {'chat_id': 100, 'content': 'b'}])
+        self.assertIsInstance(results[0].error, ex.PachcaClientUnexpectedResponseException)
+        self.assertTrue(results[1].ok)
+
+
+class TestBulkOperations(unittest.TestCase):
+    def setUp(self):
+        self.pachca = get_pachca('')
+
+        def call_api(path, method, payload=None):
+            message_id = int(path.split('/')[1])
+            if message_id == 2:
+                raise ex.PachcaAlreadyExists('exists')
+            if message_id == 3:
+                raise ex.PachcaClientEntryNotFound('not found')
+            if message_id == 4:
+                raise ex.PachcaClientBadRequestException('failed')
+        self.pachca.client.call_api = mock.MagicMock(side_effect=call_api)
+
+    def test_add_reactions(self):
+        results = self.pachca.add_reactions([(1, '👍'), (2, '👍'), (3, '👍'), (4, '👍')], workers=2)
+        self.assertListEqual([result.ok for result in results], [True, True, True, False])
+        self.assertListEqual([result.item for result in results], [(1, '👍'), (2, '👍'), (3, '👍'), (4, '👍')])
+        self.pachca.client.call_api.assert_any_call('messages/1/reactions', method='post', payload={'code': '👍'})
+
+    def test_remove_reactions(self):
+        results = self.pachca.remove_reactions([(3, '👍'), (4, '👍')])
+        self.assertListEqual([result.ok for result in results], [True, False])
+        self.pachca.client.call_api.assert_any_call('messages/3/reactions', method='delete', payload={'code': '👍'})
+
+    def test_pin_messages(self):
+        results = self.pachca.pin_messages([1, 2, 4])
+        self.assertListEqual([result.ok for result in results], [True, True, False])
+        results = self.pachca.unpin_messages([1, 3])
+        self.assertListEqual([result.ok for result in results], [True, True])
+        self.pachca.client.call_api.assert_any_call('messages/3/pin', method='delete')
+
+
+class TestCollectReactions(unittest.TestCase):
+    def test_collect_reactions(self):
+        pachca = get_pachca('')
+        messages = [{'id': message_id, 'chat_id': 10} for message_id in range(1, 8)]
+        reactions = {1: [{'code': '👍'}, {'code': '🔥'}], 2: [], 3: [{'code': '👍'}] * 3}
+
+        def call_api(path, method='get', payload=None):
+            if path == 'messages':
+                page = payload['page']
+                return messages[(page - 1) * payload['per']:page * payload['per']]
+            message_reactions = reactions.get(int(path.split('/')[1]), [])
+            page = payload['page']
+            return message_reactions[(page - 1) * payload['per']:page * payload['per']]
+        pachca.client.call_api = mock.MagicMock(side_effect=call_api)
+        counts = pachca.collect_reactions(10, workers=3, per=2)
+        self.assertDictEqual(dict(counts), {'👍': 4, '🔥': 1})
+        counts = pachca.collect_reactions(10, per=2, select=lambda message: message['id'] == 1)
+        self.assertDictEqual(dict(counts), {'👍': 1, '🔥': 1})
+
+
 class TestUpload(unittest.TestCase):
     def setUp(self):
         self.pachca = get_pachca('')
 
+    def test_new_message_with_files(self):
+        def upload(file):
+            time.sleep(0.01 * (int(file.name) % 3))
+            return {'key': f'attaches/{file.name}/${{filename}}'}
+        self.pachca.upload = mock.MagicMock(side_effect=upload)
+        self.pachca.client.call_api = mock.MagicMock(return_value={'id': 200})
+        files = [File(f'/tmp/{i}') for i in range(6)]
+        with mock.patch.object(File, 'get_size', return_value=10):
+            self.pachca.new_message(chat_id=100, content='Message', files=files)
+        payload = self.pachca.client.call_api.call_args.kwargs['payload']
+        self.assertListEqual([file['key'] for file in payload['message']['files']], [f'attaches/{i}/{i}' for i in range(6)])
+
+    def test_update_message_with_files(self):
+        self.pachca.upload = mock.MagicMock(return_value={'key': 'attaches/1/${filename}'})
+        self.pachca.client.call_api = mock.MagicMock(return_value={'id': 100, 'content': 'Updated'})
+        with mock.patch.object(File, 'get_size', return_value=10):
+            response = self.pachca.update_message(100, 'Updated', files=[File('/tmp/report.csv')])
+        self.assertDictEqual(response, {'id': 100, 'content': 'Updated'})
+        payload = self.pachca.client.call_api.call_args.args[2]
+        self.assertListEqual([file['key'] for file in payload['message']['files']], ['attaches/1/report.csv'])
+
+    def test_new_message_upload_failed(self):
+        self.pachca.upload = mock.MagicMock(side_effect=RuntimeError('failed'))
+        self.pachca.client.call_api = mock.MagicMock()
+        with self.assertRaises(RuntimeError):
+            self.pachca.new_message(chat_id=100, content='Message', files=[File('/tmp/1'), File('/tmp/2')])
+        self.pachca.client.call_api.assert_not_called()
+
+
+class TestUploadCache(unittest.TestCase):
+    def setUp(self):
+        self.pachca = Pachca(Client(''), cache=Cache(), upload_ttl=60)
+        self.pachca.client.call_api = mock.MagicMock(side_effect=lambda *args, **kwargs: {
+            'key': 'attaches/1/${filename}', 'direct_url': 'http://upload'
+        })
+        self.pachca.client.upload_stream = mock.MagicMock()
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_same_content(self):
+        first = self.pachca.upload(File(self.write('a', b'content'), name='report.txt'))
+        second = self.pachca.upload(File(self.write('b', b'content'), name='report.txt'))
+        self.assertDictEqual(first, second)
+        self.assertEqual(self.pachca.client.call_api.call_count, 1)
+        self.assertEqual(self.pachca.client.upload_stream.call_count, 1)
+
+    def test_different_content_or_name(self):
+        self.pachca.upload(File(self.write('a', b'content'), name='report.txt'))
+        self.pachca.upload(File(self.write('b', b'changed'), name='report.txt'))
+        self.pachca.upload(File(self.write('c', b'content'), name='other.txt'))
+        self.assertEqual(self.pachca.client.upload_stream.call_count, 3)
+
+    def test_disabled(self):
+        self.pachca.upload_ttl = None
+        path = self.write('a', b'content')
+        self.pachca.upload(File(path))
+        self.pachca.upload(File(path))
+        self.assertEqual(self.pachca.client.upload_stream.call_count, 2)
+
+    def test_digest_changed_file(self):
+        path = self.write('a', b'content')
+        file = File(path)
+        digest = file.digest()
+        self.write('a', b'changed content')
+        self.assertNotEqual(file.digest(), digest)
+
+    def test_invalid_ttl(self):
+        with self.assertRaises(ValueError):
+            Pachca(Client(''), upload_ttl=0)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import time
+import unittest
+from pachca_client.api.paging import iter_pages, aiter_pages
+
+
+def make_pages(total, per):
+    items = list(range(total))
+    return [items[i:i + per] for i in range(0, total, per)]
+
+
+class TestIterPages(unittest.TestCase):
+    def test_invalid_window(self):
+        with self.assertRaises(ValueError):
+            list(iter_pages(lambda page: [], 10, window=0))
+
+    def test_sequential(self):
+        pages = make_pages(25, 10)
+        requested = []
+
+        def fetch(page):
+            requested.append(page)
+            return pages[page - 1]
+        self.assertListEqual(list(iter_pages(fetch, 10)), pages)
+        self.assertListEqual(requested, [1, 2, 3])
+
+    def test_empty_last_page(self):
+        pages = make_pages(20, 10) + [[]]
+        got = list(iter_pages(lambda page: pages[page - 1] if page <= len(pages) else [], 10, window=4))
+        self.assertListEqual(got, pages)
+
+    def test_window_keeps_order(self):
+        pages = make_pages(95, 10)
+
+        def fetch(page):
+            # later pages complete earlier
+            time.sleep(0.01 * (page % 3))
+            return pages[page - 1] if page <= len(pages) else []
+        self.assertListEqual(list(iter_pages(fetch, 10, window=4)), pages)
+
+    def test_window_in_flight(self):
+        lock = threading.Lock()
+        in_flight = [0, 0]
+
+        def fetch(page):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            time.sleep(0.02)
+            with lock:
+                in_flight[0] -= 1
+            return [page] * 2 if page < 10 else []
+        got = list(iter_pages(fetch, 2, window=3))
+        self.assertEqual(len(got), 10)
+        self.assertEqual(in_flight[1], 3)
+
+    def test_error(self):
+        def fetch(page):
+            if page == 2:
+                raise RuntimeError('failed')
+            return [page]
+        with self.assertRaises(RuntimeError):
+            list(iter_pages(fetch, 1, window=2))
+
+
+class TestAsyncIterPages(unittest.IsolatedAsyncioTestCase):
+    async def test_window_keeps_order(self):
+        pages = make_pages(95, 10)
+
+        async def fetch(page):
+            await asyncio.sleep(0.01 * (page % 3))
+            return pages[page - 1] if page <= len(pages) else []
+        got = [page async for page in aiter_pages(fetch, 10, window=4)]
+        self.assertListEqual(got, pages)
+
+
+if __name__ == '__main__':
+    unittest.main()
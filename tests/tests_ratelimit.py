@@ -0,0 +1,102 @@
+import os
+import tempfile
+import threading
+import unittest
+import unittest.mock as mock
+from pachca_client import Client
+from pachca_client.api.ratelimit import TokenBucket, FileTokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_invalid_args(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=1, burst=0)
+
+    def test_burst(self):
+        bucket = TokenBucket(rate=10, burst=3)
+        bucket.clock = FakeClock()
+        bucket.updated = bucket.clock()
+        self.assertListEqual([bucket.reserve() for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(bucket.reserve(), 0.1)
+        self.assertAlmostEqual(bucket.reserve(), 0.2)
+
+    def test_refill(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        bucket.clock = FakeClock()
+        bucket.updated = bucket.clock()
+        bucket.reserve()
+        bucket.reserve()
+        bucket.clock.now += 1
+        # the bucket does not hold more than burst tokens
+        self.assertListEqual([bucket.reserve() for _ in range(2)], [0, 0])
+        self.assertAlmostEqual(bucket.reserve(), 0.1)
+
+    def test_threads(self):
+        bucket = TokenBucket(rate=100, burst=1)
+        bucket.clock = FakeClock()
+        bucket.updated = bucket.clock()
+        delays = []
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(10):
+                delay = bucket.reserve()
+                with lock:
+                    delays.append(delay)
+        threads = [threading.Thread(target=worker) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # every caller gets its own slot
+        self.assertListEqual(sorted(round(delay, 6) for delay in delays), [round(i * 0.01, 6) for i in range(100)])
+
+
+class TestFileTokenBucket(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_shared(self):
+        clock = FakeClock()
+        a = FileTokenBucket(self.path, rate=10, burst=2)
+        b = FileTokenBucket(self.path, rate=10, burst=2)
+        a.clock = b.clock = clock
+        self.assertEqual(a.reserve(), 0)
+        self.assertEqual(b.reserve(), 0)
+        self.assertAlmostEqual(a.reserve(), 0.1)
+        self.assertAlmostEqual(b.reserve(), 0.2)
+        clock.now += 10
+        self.assertEqual(b.reserve(), 0)
+
+
+class TestClientRateLimit(unittest.TestCase):
+    def test_acquire_before_send(self):
+        limiter = mock.MagicMock()
+        client = Client('', rate_limiter=limiter)
+        client.session = mock.MagicMock()
+
+        def send(*args, **kwargs):
+            limiter.acquire.assert_called_once()
+            return mock.MagicMock()
+        client.session.send.side_effect = send
+        client.handle_response = mock.MagicMock()
+        client.call_api('chats')
+        client.session.send.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import socket
+import unittest
+import unittest.mock as mock
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from requests.exceptions import ConnectionError
+from pachca_client import Client
+from pachca_client.api.async_client import AsyncClient
+from pachca_client.api.retry import RetryPolicy, parse_retry_after
+import pachca_client.api.exceptions as ex
+from stub_server import StubServer
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_invalid_attempts(self):
+        with self.assertRaises(ValueError):
+            RetryPolicy(attempts=0)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('3'), 3)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+        date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+        self.assertAlmostEqual(parse_retry_after(date), 30, delta=2)
+        date = format_datetime(datetime.now(timezone.utc) - timedelta(seconds=30), usegmt=True)
+        self.assertEqual(parse_retry_after(date), 0)
+
+    def test_delay(self):
+        policy = RetryPolicy(backoff=1, max_backoff=5, jitter=False)
+        self.assertListEqual([policy.delay(attempt) for attempt in range(1, 5)], [1, 2, 4, 5])
+        self.assertEqual(policy.delay(1, '3'), 3)
+
+    def test_retry_after_capped(self):
+        policy = RetryPolicy(max_backoff=30)
+        self.assertEqual(policy.delay(1, '86400'), 30)
+
+    def test_delay_jitter(self):
+        policy = RetryPolicy(backoff=1)
+        for _ in range(10):
+            self.assertTrue(0 <= policy.delay(3) <= 4)
+
+    def test_should_retry(self):
+        policy = RetryPolicy(attempts=3)
+        self.assertTrue(policy.should_retry('get', 1, status_code=503))
+        self.assertTrue(policy.should_retry('GET', 2))
+        self.assertFalse(policy.should_retry('GET', 3, status_code=503))
+        self.assertFalse(policy.should_retry('GET', 1, status_code=404))
+        self.assertFalse(policy.should_retry('POST', 1, status_code=503))
+        self.assertTrue(policy.should_retry('POST', 1, retryable=True, status_code=429))
+        self.assertFalse(policy.should_retry('GET', 1, retryable=False, status_code=429))
+
+
+class TestClientRetry(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer().__enter__()
+        self.retries = []
+        self.client = Client('', retry=RetryPolicy(attempts=3, backoff=0))
+        self.client.API_URL = self.server.url
+        self.client.add_hook('retry', lambda **kwargs: self.retries.append(kwargs))
+
+    def tearDown(self):
+        self.server.__exit__()
+
+    def test_unknown_hook(self):
+        with self.assertRaises(ValueError):
+            self.client.add_hook('unknown', print)
+
+    def test_retry_get(self):
+        self.server.add(503)
+        self.server.add(429, headers={'Retry-After': '0'})
+        self.server.add(200, {'data': [1]})
+        self.assertListEqual(self.client.call_api('chats'), [1])
+        self.assertListEqual([r['attempt'] for r in self.retries], [1, 2])
+        self.assertListEqual([r['status_code'] for r in self.retries], [503, 429])
+
+    def test_retry_exhausted(self):
+        for _ in range(3):
+            self.server.add(502)
+        with self.assertRaises(ex.PachcaClientUnexpectedResponseException):
+            self.client.call_api('chats')
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_no_retry_post(self):
+        self.server.add(503)
+        with self.assertRaises(ex.PachcaClientUnexpectedResponseException):
+            self.client.call_api('messages', 'post', {'message': {}})
+        self.assertEqual(len(self.retries), 0)
+
+    def test_retry_retryable_post(self):
+        self.server.add(503)
+        self.server.add(201, {'key': 'value'})
+        self.assertDictEqual(self.client.call_api('uploads', 'post', retryable=True), {'key': 'value'})
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_no_retry_client_error(self):
+        self.server.add(404, {'errors': 'not found'})
+        with self.assertRaises(ex.PachcaClientEntryNotFound):
+            self.client.call_api('chats/1')
+        self.assertEqual(len(self.retries), 0)
+
+    @mock.patch('pachca_client.api.client.time.sleep')
+    def test_retry_after(self, sleep):
+        self.server.add(429, headers={'Retry-After': '7'})
+        self.server.add(200, {'data': []})
+        self.client.call_api('chats')
+        sleep.assert_called_once_with(7)
+
+    def test_retry_connection_error(self):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        self.client.API_URL = f'http://127.0.0.1:{port}/'
+        with self.assertRaises(ConnectionError):
+            self.client.call_api('chats')
+        self.assertEqual(len(self.retries), 2)
+        self.assertIsInstance(self.retries[0]['error'], ConnectionError)
+
+
+class TestAsyncClientRetry(unittest.IsolatedAsyncioTestCase):
+    async def test_retry_get(self):
+        retries = []
+        with StubServer() as server:
+            server.add(503)
+            server.add(200, {'data': [1]})
+            async with AsyncClient('', retry=RetryPolicy(backoff=0)) as client:
+                client.API_URL = server.url
+                client.add_hook('retry', lambda **kwargs: retries.append(kwargs))
+                self.assertListEqual(await client.call_api('chats'), [1])
+        self.assertEqual(len(retries), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
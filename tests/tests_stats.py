@@ -0,0 +1,81 @@
+import unittest
+from pachca_client import Pachca, Client, Cache, Stats
+from pachca_client.api.retry import RetryPolicy
+from pachca_client.api.stats import Histogram, StatsdExporter, format_prometheus, labels_of, path_template
+from stub_server import StubServer
+
+
+class TestPathTemplate(unittest.TestCase):
+    def test_path_template(self):
+        base = 'https://api.pachca.com/api/shared/v1/'
+        self.assertEqual(path_template(base, base + 'messages/100'), 'messages/{id}')
+        self.assertEqual(path_template(base, base + 'messages/100/reactions?code=1'), 'messages/{id}/reactions')
+        self.assertEqual(path_template(base, base + 'chats?per=50'), 'chats')
+        self.assertEqual(path_template(base, 'https://uploads.example.com/bucket/key'), 'uploads.example.com')
+
+
+class TestHistogram(unittest.TestCase):
+    def test_cumulative(self):
+        h = Histogram((1, 5))
+        for value in (0.5, 1, 3, 10):
+            h.observe(value)
+        self.assertListEqual(h.cumulative(), [(1, 2), (5, 3), (float('inf'), 4)])
+        self.assertEqual(h.sum, 14.5)
+        self.assertEqual(h.count, 4)
+
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        self.stats = Stats()
+
+    def test_client(self):
+        with StubServer() as server:
+            server.add(503, '')
+            server.add(200, {'data': {'id': 1}})
+            client = Client('', retry=RetryPolicy(backoff=0))
+            client.API_URL = server.url
+            self.stats.watch_client(client)
+            client.call_api('messages/1')
+        counters, histograms = self.stats.snapshot()
+        self.assertEqual(counters[('retries_total', labels_of(method='GET', path='messages/{id}'))], 1)
+        self.assertEqual(histograms[('request_duration_seconds', labels_of(method='GET', path='messages/{id}', status=503))][2], 1)
+        self.assertEqual(histograms[('request_duration_seconds', labels_of(method='GET', path='messages/{id}', status=200))][2], 1)
+        self.assertEqual(histograms[('request_size_bytes', labels_of(method='GET', path='messages/{id}'))][2], 2)
+
+    def test_pachca(self):
+        pachca = Pachca(Client(''), Cache())
+        pachca.client.call_api = lambda *args, **kwargs: [{'id': 1, 'name': 'Chat1'}]
+        self.stats.watch(pachca)
+        pachca.resolve_chat_name('Chat1')
+        pachca.resolve_chat_name('Chat1')
+        counters, histograms = self.stats.snapshot()
+        self.assertEqual(histograms[('method_duration_seconds', labels_of(method='resolve_chat_name', outcome='success'))][2], 2)
+        self.assertEqual(histograms[('method_duration_seconds', labels_of(method='list_all_chats', outcome='success'))][2], 1)
+        self.assertGreaterEqual(counters[('cache_events_total', labels_of(cache='default', event='hit'))], 1)
+
+    def test_prometheus(self):
+        self.stats.increment('retries_total', labels_of(method='GET', path='chats'))
+        self.stats.observe('request_duration_seconds', labels_of(path='chats'), 0.2, (0.1, 1))
+        self.assertEqual(format_prometheus(self.stats), '\n'.join([
+            '# TYPE pachca_retries_total counter',
+            'pachca_retries_total{method="GET",path="chats"} 1',
+            '# TYPE pachca_request_duration_seconds histogram',
+            'pachca_request_duration_seconds_bucket{path="chats",le="0.1"} 0',
+            'pachca_request_duration_seconds_bucket{path="chats",le="1.0"} 1',
+            'pachca_request_duration_seconds_bucket{path="chats",le="+Inf"} 1',
+            'pachca_request_duration_seconds_sum{path="chats"} 0.2',
+            'pachca_request_duration_seconds_count{path="chats"} 1',
+        ]) + '\n')
+
+    def test_statsd(self):
+        exporter = StatsdExporter()
+        self.addCleanup(exporter.close)
+        self.stats.increment('retries_total', labels_of(path='chats'))
+        self.assertListEqual(exporter.lines(self.stats), ['pachca.retries_total:1|c|#path:chats'])
+        self.assertListEqual(exporter.lines(self.stats), [])
+        self.stats.increment('retries_total', labels_of(path='chats'), 2)
+        self.assertListEqual(exporter.lines(self.stats), ['pachca.retries_total:2|c|#path:chats'])
+
+
+if __name__ == '__main__':
+    unittest.main()